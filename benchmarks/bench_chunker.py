@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for chunk_text_with_metadata.
+
+Times chunking of synthetic documents at growing sizes and chunk limits and
+prints the cost per word, which stays flat when chunking is linear. Pass
+--against <git rev> to time the chunker from another commit on the same input
+and check that both produce identical chunks:
+
+    python benchmarks/bench_chunker.py
+    python benchmarks/bench_chunker.py --against HEAD~1
+"""
+
+import argparse
+import random
+import subprocess
+import sys
+import time
+import types
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(REPO_ROOT / "src"))
+
+from chunker import chunk_text_with_metadata
+
+WORDS = ("system process requirement software test release quality review document safety "
+         "audit change control risk validation user design interface module data report").split()
+
+
+def make_document(words: int, seed: int = 42):
+    """Synthetic text of roughly `words` words with 400-word pages"""
+    rng = random.Random(seed)
+    sentences = []
+    count = 0
+    while count < words:
+        length = rng.randint(5, 30)
+        sentences.append(" ".join(rng.choice(WORDS) for _ in range(length)).capitalize() + ".")
+        count += length
+    text = " ".join(sentences)
+
+    page_metadata = []
+    page_chars = len(text) * 400 // max(count, 1)
+    for page, start in enumerate(range(0, len(text), max(page_chars, 1))):
+        page_metadata.append({"page_number": page + 1, "char_start": start, "char_end": min(start + page_chars, len(text))})
+    return text, page_metadata, count
+
+
+def load_chunker(rev: str):
+    """Load chunk_text_with_metadata as it was at a given git revision"""
+    source = subprocess.check_output(["git", "show", f"{rev}:src/chunker.py"], cwd=REPO_ROOT, text=True)
+    module = types.ModuleType(f"chunker_{rev}")
+    exec(compile(source, f"{rev}:src/chunker.py", "exec"), module.__dict__)
+    return module.chunk_text_with_metadata
+
+
+def best_time(func, repeat: int, *args) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the text chunker.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000],
+                        help="Document sizes in words.")
+    parser.add_argument("--max-tokens", type=int, nargs="+", default=[128, 512, 2048],
+                        help="Chunk limits to test.")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--against", help="Git revision whose chunker is timed on the same input.")
+    args = parser.parse_args()
+
+    baseline = load_chunker(args.against) if args.against else None
+
+    print(f"{'words':>10} {'max_tokens':>10} {'chunks':>8} {'seconds':>9} {'us/word':>8}"
+          + (f" {args.against + ' s':>12} {'speedup':>8}" if baseline else ""))
+    for size in args.sizes:
+        text, page_metadata, words = make_document(size)
+        for max_tokens in args.max_tokens:
+            chunks = chunk_text_with_metadata(text, page_metadata, max_tokens)
+            seconds = best_time(chunk_text_with_metadata, args.repeat, text, page_metadata, max_tokens)
+            line = f"{words:>10} {max_tokens:>10} {len(chunks):>8} {seconds:>9.3f} {seconds / words * 1e6:>8.2f}"
+            if baseline:
+                if baseline(text, page_metadata, max_tokens) != chunks:
+                    print(f"❌ Chunks differ from {args.against} for {words} words, max_tokens={max_tokens}")
+                old_seconds = best_time(baseline, args.repeat, text, page_metadata, max_tokens)
+                line += f" {old_seconds:>12.3f} {old_seconds / seconds:>7.1f}x"
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
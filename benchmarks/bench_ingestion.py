@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""
+Ingestion benchmark for every DocumentLoader format.
+
+Generates synthetic documents of configurable size offline, runs the matching
+extractor on each in a fresh process and reports MB/s, units/s (pages, paragraphs,
+rows or slides) and peak memory. Results are saved as JSON so runs can be
+compared across commits:
+
+    python benchmarks/bench_ingestion.py --pages 200 --rows 100000
+    python benchmarks/bench_ingestion.py --compare benchmarks/results/<older>.json
+"""
+
+import argparse
+import json
+import multiprocessing
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from queue import Empty
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(REPO_ROOT / "src"))
+
+RESULTS_DIR = REPO_ROOT / "benchmarks" / "results"
+
+# Seconds between checks on a running extraction, and before one is given up on
+RESULT_POLL_SECONDS = 0.5
+RUN_TIMEOUT = 600
+
+WORDS = ("system process requirement software test release quality review document safety "
+         "audit change control risk validation user design interface module data report").split()
+
+
+def _sentence(rng: random.Random, words: int = 12) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def _paragraph(rng: random.Random, sentences: int = 20) -> str:
+    return " ".join(_sentence(rng) for _ in range(sentences))
+
+
+# --- Synthetic document generators. Each returns the number of units written. ---
+
+def make_pdf(path: Path, size: int, rng: random.Random) -> int:
+    import fitz
+    doc = fitz.open()
+    for _ in range(size):
+        page = doc.new_page()
+        page.insert_textbox(fitz.Rect(40, 40, 560, 800), _paragraph(rng, 25), fontsize=8)
+    doc.save(path)
+    doc.close()
+    return size
+
+
+def make_docx(path: Path, size: int, rng: random.Random) -> int:
+    from docx import Document
+    doc = Document()
+    for _ in range(size):
+        doc.add_paragraph(_paragraph(rng, 5))
+    doc.save(path)
+    return size
+
+
+def make_xlsx(path: Path, size: int, rng: random.Random) -> int:
+    from openpyxl import Workbook
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Data")
+    for row in range(size):
+        sheet.append([row, rng.choice(WORDS), rng.random() * 1000, _sentence(rng, 6)])
+    workbook.save(path)
+    return size
+
+
+def make_xls(path: Path, size: int, rng: random.Random) -> int:
+    import xlwt
+    workbook = xlwt.Workbook()
+    # The legacy format caps a sheet at 65536 rows
+    for sheet_index in range(0, size, 65536):
+        sheet = workbook.add_sheet(f"Data{sheet_index // 65536 + 1}")
+        for row in range(min(65536, size - sheet_index)):
+            for col, value in enumerate([row, rng.choice(WORDS), rng.random() * 1000, _sentence(rng, 6)]):
+                sheet.write(row, col, value)
+    workbook.save(str(path))
+    return size
+
+
+def make_pptx(path: Path, size: int, rng: random.Random) -> int:
+    from pptx import Presentation
+    from pptx.util import Inches
+    presentation = Presentation()
+    layout = presentation.slide_layouts[1]
+    for _ in range(size):
+        slide = presentation.slides.add_slide(layout)
+        slide.shapes.title.text = _sentence(rng, 5)
+        slide.placeholders[1].text = _paragraph(rng, 6)
+        slide.shapes.add_textbox(Inches(1), Inches(6), Inches(8), Inches(1)).text = _sentence(rng)
+    presentation.save(path)
+    return size
+
+
+# format -> (generator, extractor method, size option, unit name)
+FORMATS = {
+    "pdf": (make_pdf, "extract_pdf", "pages", "pages"),
+    "docx": (make_docx, "extract_docx", "paragraphs", "paragraphs"),
+    "xlsx": (make_xlsx, "extract_xlsx", "rows", "rows"),
+    "xls": (make_xls, "extract_xls", "rows", "rows"),
+    "pptx": (make_pptx, "extract_pptx", "slides", "slides"),
+}
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+def _run_extractor(method: str, path: str, queue):
+    """Child process: extract once and report elapsed time and memory, or the error"""
+    import logging
+    logging.disable(logging.WARNING)
+    try:
+        from document_loader import DocumentLoader
+        loader = DocumentLoader()
+        baseline = _peak_rss_mb()
+        start = time.perf_counter()
+        result = getattr(loader, method)(Path(path))
+        seconds = time.perf_counter() - start
+    except Exception as e:
+        queue.put({"error": f"{type(e).__name__}: {e}"})
+        return
+    queue.put({
+        "seconds": seconds,
+        "peak_rss_mb": _peak_rss_mb(),
+        "peak_rss_growth_mb": _peak_rss_mb() - baseline,
+        "chars": len(result[1]) if result else 0,
+    })
+
+
+def _wait_for_run(process, queue, timeout: float) -> dict:
+    """The report of one run, or an error once the child dies or runs out of time"""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            return queue.get(timeout=RESULT_POLL_SECONDS)
+        except Empty:
+            pass
+        if not process.is_alive():
+            try:
+                # It may have reported just before exiting
+                return queue.get(timeout=RESULT_POLL_SECONDS)
+            except Empty:
+                return {"error": f"extraction process exited with code {process.exitcode}"}
+        if time.monotonic() > deadline:
+            process.kill()
+            return {"error": f"no result after {timeout:.0f}s"}
+
+
+def measure(method: str, path: Path, repeat: int, timeout: float) -> dict:
+    """
+    Best-of-N extraction, each run in a fresh process so peak memory is per run.
+
+    Returns {"error": ...} if no run succeeded.
+    """
+    context = multiprocessing.get_context("spawn")
+    runs = []
+    for _ in range(repeat):
+        queue = context.Queue()
+        process = context.Process(target=_run_extractor, args=(method, str(path), queue))
+        process.start()
+        runs.append(_wait_for_run(process, queue, timeout))
+        process.join()
+    succeeded = [run for run in runs if "error" not in run]
+    if not succeeded:
+        return runs[-1]
+    return min(succeeded, key=lambda run: run["seconds"])
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run_benchmarks(args) -> dict:
+    rng = random.Random(args.seed)
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for fmt in args.formats:
+            generate, method, size_option, unit_name = FORMATS[fmt]
+            size = getattr(args, size_option)
+            path = Path(tmp_dir) / f"bench.{fmt}"
+            try:
+                units = generate(path, size, rng)
+            except ImportError as e:
+                print(f"⚠️ Skipping {fmt}: {e}")
+                continue
+
+            file_mb = path.stat().st_size / 1024 / 1024
+            run = measure(method, path, args.repeat, args.timeout)
+            if "error" in run:
+                print(f"❌ {fmt}: {run['error']}")
+                results.append({"format": fmt, "units": units, "unit_name": unit_name, "failed": run["error"]})
+                continue
+            seconds = run["seconds"]
+            results.append({
+                "format": fmt,
+                "units": units,
+                "unit_name": unit_name,
+                "file_mb": round(file_mb, 3),
+                "chars": run["chars"],
+                "seconds": round(seconds, 4),
+                "mb_per_s": round(file_mb / seconds, 3) if seconds else None,
+                "units_per_s": round(units / seconds, 1) if seconds else None,
+                "peak_rss_mb": round(run["peak_rss_mb"], 1),
+                "peak_rss_growth_mb": round(run["peak_rss_growth_mb"], 1),
+            })
+            row = results[-1]
+            print(f"{fmt:>5}: {units} {unit_name}, {row['file_mb']:.2f} MB in {seconds:.3f}s - "
+                  f"{row['mb_per_s']} MB/s, {row['units_per_s']} {unit_name}/s, "
+                  f"peak RSS {row['peak_rss_mb']} MB (+{row['peak_rss_growth_mb']} MB)")
+
+    return {
+        "benchmark": "ingestion",
+        "commit": git_commit(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "params": {key: getattr(args, key) for key in ("pages", "paragraphs", "rows", "slides", "repeat", "seed")},
+        "results": results,
+    }
+
+
+def compare(current: dict, baseline_path: str):
+    """Print the change in throughput and memory against an earlier results file"""
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    if baseline.get("params") != current.get("params"):
+        print("⚠️ Benchmark parameters differ from the baseline; the comparison may not be meaningful.")
+    previous = {row["format"]: row for row in baseline.get("results", [])}
+    print(f"\nComparison against {baseline.get('commit')} ({baseline_path}):")
+    for row in current["results"]:
+        old = previous.get(row["format"])
+        if not old or not old.get("units_per_s") or not row.get("units_per_s"):
+            continue
+        speed = (row["units_per_s"] / old["units_per_s"] - 1) * 100
+        memory = row["peak_rss_growth_mb"] - old["peak_rss_growth_mb"]
+        print(f"{row['format']:>5}: throughput {speed:+.1f}%, peak memory growth {memory:+.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark DocumentLoader extraction for each supported format.")
+    parser.add_argument("--formats", nargs="+", choices=list(FORMATS), default=list(FORMATS))
+    parser.add_argument("--pages", type=int, default=100, help="Pages in the synthetic PDF.")
+    parser.add_argument("--paragraphs", type=int, default=2000, help="Paragraphs in the synthetic DOCX.")
+    parser.add_argument("--rows", type=int, default=20000, help="Rows in the synthetic XLSX/XLS.")
+    parser.add_argument("--slides", type=int, default=100, help="Slides in the synthetic PPTX.")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per format; the fastest is reported.")
+    parser.add_argument("--timeout", type=float, default=RUN_TIMEOUT, help="Seconds before a run is killed and recorded as failed.")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Results file (default: benchmarks/results/ingestion-<commit>-<time>.json).")
+    parser.add_argument("--compare", help="Earlier results file to compare against.")
+    args = parser.parse_args()
+
+    report = run_benchmarks(args)
+
+    output = Path(args.output) if args.output else (
+        RESULTS_DIR / f"ingestion-{report['commit']}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n💾 Results saved to {output}")
+
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == "__main__":
+    main()
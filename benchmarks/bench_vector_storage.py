@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Recall-vs-memory report for reduced-precision vector storage.
+
+Builds every index type at each storage precision (fp32, fp16, sq8) over the
+same vectors, with and without exact re-scoring, and reports recall@k against
+exact float32 search, resident index size per vector and query latency.
+Re-scoring reads the float32 vectors from a memory-mapped file, so they cost
+disk rather than RAM; the report lists that separately.
+
+Vectors are synthetic clustered embeddings by default, or the vectors.npy of
+a flat index built with --build:
+
+    python benchmarks/bench_vector_storage.py --vectors 200000
+    python benchmarks/bench_vector_storage.py --from-index embeddings --metric cosine
+"""
+
+import argparse
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(REPO_ROOT / "src"))
+
+import faiss
+
+from index_factory import (DEFAULT_RESCORE_FACTOR, STORAGE_TYPES, VECTORS_FILE, MappedFlatIndex, RescoredIndex,
+                           create_index, index_params, needs_training, training_rows, train_index)
+
+
+def make_vectors(count: int, dim: int, clusters: int, seed: int) -> np.ndarray:
+    """Clustered vectors, anisotropic like sentence embeddings, rather than uniform noise"""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype("float32")
+    scales = rng.uniform(0.2, 1.0, dim).astype("float32")
+    labels = rng.integers(0, clusters, count)
+    return centers[labels] + rng.standard_normal((count, dim)).astype("float32") * scales * 0.6
+
+
+def split_queries(vectors: np.ndarray, queries: int, seed: int):
+    """Hold out perturbed copies of random vectors as queries"""
+    rng = np.random.default_rng(seed + 1)
+    picks = rng.choice(len(vectors), min(queries, len(vectors)), replace=False)
+    noise = rng.standard_normal((len(picks), vectors.shape[1])).astype("float32") * vectors.std() * 0.1
+    return np.ascontiguousarray(vectors[picks] + noise)
+
+
+def index_bytes(index) -> int:
+    """Resident size of an index: its serialized form, which faiss loads as-is"""
+    return faiss.serialize_index(index).nbytes
+
+
+def recall_at_k(found: np.ndarray, truth: np.ndarray) -> float:
+    k = truth.shape[1]
+    return float(np.mean([len(set(f[f >= 0]) & set(t)) / k for f, t in zip(found, truth)]))
+
+
+def build(vectors: np.ndarray, metric: str, params: dict):
+    if needs_training(params):
+        sample = vectors[:training_rows(params)]
+        index, params = train_index(vectors.shape[1], metric, params, sample)
+    else:
+        index = create_index(vectors.shape[1], metric, params)
+    index.add(vectors)
+    return index
+
+
+def timed_search(index, queries: np.ndarray, k: int):
+    start = time.perf_counter()
+    _, found = index.search(queries, k)
+    return found, (time.perf_counter() - start) / len(queries) * 1000
+
+
+def run(args) -> dict:
+    if args.from_index:
+        vectors = np.load(Path(args.from_index) / VECTORS_FILE).astype("float32")
+        print(f"📦 {len(vectors)} vector(s) of dimension {vectors.shape[1]} from {args.from_index}")
+    else:
+        vectors = make_vectors(args.vectors, args.dim, args.clusters, args.seed)
+        print(f"🧪 {len(vectors)} synthetic vector(s) of dimension {vectors.shape[1]}")
+    queries = split_queries(vectors, args.queries, args.seed)
+    if args.metric == "cosine":
+        faiss.normalize_L2(vectors)
+        faiss.normalize_L2(queries)
+    k = min(args.k, len(vectors))
+
+    exact = create_index(vectors.shape[1], args.metric)
+    exact.add(vectors)
+    truth, exact_ms = timed_search(exact, queries, k)
+    fp32_bytes = index_bytes(exact)
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # Re-scoring reads the float32 vectors through a memory map, as served
+        raw_path = Path(tmp_dir) / VECTORS_FILE
+        np.save(raw_path, vectors)
+        raw = MappedFlatIndex(np.load(raw_path, mmap_mode="r"), args.metric)
+
+        for index_type in args.types:
+            for storage in (["fp32"] if index_type == "ivf_pq" else args.storage):
+                params = index_params(index_type, nlist=args.nlist, nprobe=args.nprobe, storage=storage)
+                index = build(vectors, args.metric, params)
+                size = index_bytes(index)
+                variants = [("-", index)]
+                # Re-scoring fp32 candidates only repeats exact distances
+                if storage != "fp32" or index_type == "ivf_pq":
+                    variants.append((f"x{args.rescore}", RescoredIndex(index, raw, args.rescore)))
+                for rescore, searched in variants:
+                    found, ms = timed_search(searched, queries, k)
+                    results.append({
+                        "type": index_type,
+                        "storage": "pq" if index_type == "ivf_pq" else storage,
+                        "rescore": rescore,
+                        f"recall@{k}": round(recall_at_k(found, truth), 4),
+                        "index_mb": round(size / 1024 / 1024, 2),
+                        "bytes_per_vector": round(size / len(vectors), 1),
+                        "vs_flat_fp32": round(fp32_bytes / size, 2),
+                        "raw_on_disk_mb": round(vectors.nbytes / 1024 / 1024, 2) if rescore != "-" else 0.0,
+                        "query_ms": round(ms, 3),
+                    })
+
+    print(f"\n{'type':>9} {'storage':>7} {'rescore':>7} {'recall@' + str(k):>9} {'index MB':>9} "
+          f"{'B/vector':>9} {'chunks/RAM':>10} {'disk MB':>8} {'ms/query':>9}")
+    print(f"{'exact':>9} {'fp32':>7} {'-':>7} {1.0:>9.4f} {fp32_bytes / 1024 / 1024:>9.2f} "
+          f"{fp32_bytes / len(vectors):>9.1f} {1.0:>9.2f}x {0.0:>8.2f} {exact_ms:>9.3f}")
+    for row in results:
+        print(f"{row['type']:>9} {row['storage']:>7} {row['rescore']:>7} {row[f'recall@{k}']:>9.4f} "
+              f"{row['index_mb']:>9.2f} {row['bytes_per_vector']:>9.1f} {row['vs_flat_fp32']:>9.2f}x "
+              f"{row['raw_on_disk_mb']:>8.2f} {row['query_ms']:>9.3f}")
+
+    return {
+        "benchmark": "vector_storage",
+        "params": {key: getattr(args, key) for key in
+                   ("from_index", "vectors", "dim", "clusters", "queries", "k", "metric", "nlist", "nprobe",
+                    "rescore", "seed")},
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report recall against memory for reduced-precision vector storage.")
+    parser.add_argument("--from-index", help="Embedding directory whose vectors.npy to use instead of synthetic vectors.")
+    parser.add_argument("--vectors", type=int, default=100_000, help="Synthetic vectors to index.")
+    parser.add_argument("--dim", type=int, default=384, help="Dimension of the synthetic vectors.")
+    parser.add_argument("--clusters", type=int, default=200, help="Clusters the synthetic vectors are drawn around.")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--metric", choices=("l2", "cosine"), default="cosine")
+    parser.add_argument("--types", nargs="+", choices=("flat", "ivf_flat", "ivf_pq", "hnsw"),
+                        default=["flat", "ivf_flat", "hnsw", "ivf_pq"])
+    parser.add_argument("--storage", nargs="+", choices=STORAGE_TYPES, default=list(STORAGE_TYPES))
+    parser.add_argument("--nlist", type=int, default=256, help="Inverted lists of the IVF indexes.")
+    parser.add_argument("--nprobe", type=int, default=16)
+    parser.add_argument("--rescore", type=int, default=DEFAULT_RESCORE_FACTOR, help="Candidates per result to re-score.")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Also save the results as JSON to this file.")
+    args = parser.parse_args()
+
+    report = run(args)
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n💾 Results saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,26 +1,257 @@
-from document_loader import extract_text_from_pdfs, DocumentLoader
-from chunker import chunk_text, chunk_text_with_metadata
-from embedder import build_faiss_index
+from document_loader import DocumentLoader
+from embedder import (ENCODE_BATCH_SIZE, ChunkEncoder, StreamingIndexWriter, count_truncated, get_tokenizer,
+                      index_metric, open_embedding_cache)
+from dedup import DEFAULT_THRESHOLD, NearDuplicateFilter
+from embedding_cache import EMBED_CACHE_DIR
+from extraction_cache import EXTRACT_CACHE_DIR
+from index_editor import IndexEditor
+from index_factory import (DEFAULT_RESCORE_FACTOR, INDEX_TYPES, METRICS, STORAGE_TYPES, convert_to_stable_ids,
+                           index_params, index_type, supports_removal)
+from manifest import BuildManifest, Quarantine, load_index_info, save_index_info
+from metadata_store import METADATA_DB, MetadataStore, MetadataUpdater, has_chunk_ids, migrate_to_chunk_ids
+from pipeline import BATCH_SIZE, BackgroundStage, iter_batches, iter_chunk_records, iter_documents
+from model_manager import EMBEDDING_BACKENDS, DEFAULT_BACKEND, configure_model, preload_model
 from retriever import load_faiss_index, retrieve
 from generator import generate_answer, generate_detailed_answer
+import numpy as np
 import os
+import time
 from pathlib import Path
 
 DOC_DIR = "data"  # Renamed from PDF_DIR since we now support multiple formats
 EMBEDDING_DIR = "embeddings"
 
-def run_build_pipeline():
-    print("📄 Extracting documents (PDF, DOCX, XLSX, PPTX, etc.) with metadata...")
-    raw_docs = extract_text_from_pdfs(DOC_DIR)  # Function now handles all supported formats
+# Per-file extraction budgets; files that exceed them are quarantined
+FILE_TIME_LIMIT = 600  # seconds
+FILE_MEMORY_LIMIT_MB = 4096
 
-    if not raw_docs:
+# "words" sizes chunks in whitespace-separated words, "tokens" in the
+# embedding model's own tokens, matched to its sequence limit
+CHUNKING_MODES = ("words", "tokens")
+
+# Index settings and the index types they apply to
+TYPE_SETTINGS = {
+    "nlist": ("ivf_flat", "ivf_pq"),
+    "nprobe": ("ivf_flat", "ivf_pq"),
+    "pq_m": ("ivf_pq",),
+    "hnsw_m": ("hnsw",),
+    "ef_search": ("hnsw",),
+}
+
+# Query-time defaults, which change without rebuilding the index
+SEARCH_SETTINGS = ("nprobe", "ef_search")
+
+def requested_index_params(existing: dict, index_type: str = None, storage: str = None, rescore: int = None,
+                           **settings) -> dict:
+    """
+    Index parameters for --build: the existing index's, with only the settings given changed.
+
+    Switching to another index type starts from that type's defaults instead.
+    Raises ValueError for combinations index_params() rejects.
+    """
+    existing = existing or {}
+    index_type = index_type or existing.get("type", "flat")
+    for key, value in settings.items():
+        if value is not None and index_type not in TYPE_SETTINGS[key]:
+            raise ValueError(f"--{key.replace('_', '-')} only applies to {' and '.join(TYPE_SETTINGS[key])} "
+                             f"indexes, not {index_type}")
+    if index_type != existing.get("type", "flat"):
+        existing = {}
+    kept = {key: existing.get(key) for key in ("pq_m", "hnsw_m", "ef_search")}
+    # nlist and nprobe may have been shrunk to fit a small corpus; keep what was asked for
+    for key in ("nlist", "nprobe"):
+        kept[key] = existing.get(f"target_{key}", existing.get(key))
+    kept.update({key: value for key, value in settings.items() if value is not None})
+    storage = storage or existing.get("storage", "fp32")
+    if rescore is None and (storage != "fp32" or index_type == "ivf_pq"):
+        rescore = existing.get("rescore")
+    return index_params(index_type, storage=storage, rescore=rescore, **kept)
+
+
+def build_settings_differ(existing: dict, params: dict) -> bool:
+    """Whether params ask for an index that only a full rebuild can produce"""
+    if not existing or not params:
+        return False
+    # nlist as asked for, before fit_params() shrank it to the corpus
+    asked_nlist = lambda p: p.get("target_nlist", p.get("nlist"))
+    return asked_nlist(params) != asked_nlist(existing) or any(
+        params.get(key) != existing.get(key) for key in ("type", "storage", "rescore", "pq_m", "hnsw_m"))
+
+
+def with_search_settings(existing: dict, params: dict) -> dict:
+    """The existing index's parameters, taking the query-time defaults of params"""
+    if not existing or not params or params.get("type") != existing.get("type"):
+        return existing
+    updated = dict(existing)
+    for key in SEARCH_SETTINGS:
+        if key in existing and params.get(key) is not None:
+            updated[key] = params[key]
+    if "target_nprobe" in existing:
+        # As in fit_params: what was asked for, capped at the lists trained
+        updated["target_nprobe"] = updated["nprobe"]
+        updated["nprobe"] = min(updated["nprobe"], existing["nlist"])
+    return updated
+
+
+def store_search_settings(params: dict):
+    """Record new query-time defaults for the existing index, without rebuilding it"""
+    info = load_index_info(EMBEDDING_DIR)
+    if build_settings_differ(info.get("index"), params):
+        print("⚠️ New index type or build settings only take effect with --build --full")
+    updated = with_search_settings(info.get("index"), params)
+    if updated != info.get("index"):
+        info["index"] = updated
+        save_index_info(EMBEDDING_DIR, info)
+        print("🔧 Stored new query defaults: " + ", ".join(f"{key}={updated[key]}" for key in SEARCH_SETTINGS
+                                                          if key in updated))
+
+
+def run_build_pipeline(workers: int = 1, full: bool = False, batch_size: int = BATCH_SIZE,
+                       extract_cache: bool = True, dedup_threshold: float = DEFAULT_THRESHOLD,
+                       time_limit: float = FILE_TIME_LIMIT, memory_limit_mb: float = FILE_MEMORY_LIMIT_MB,
+                       retry_quarantined: bool = False, chunking: str = "words", embed_cache: bool = True,
+                       embed_batch_size: int = ENCODE_BATCH_SIZE, embed_workers: int = 1, embed_threads: int = None,
+                       metric: str = None, params: dict = None):
+    # Cached extractions let re-chunking experiments (--full) skip document parsing
+    loader = DocumentLoader(cache_dir=EXTRACT_CACHE_DIR if extract_cache else None,
+                            time_limit=time_limit, memory_limit_mb=memory_limit_mb)
+    scan = loader.scan_documents(DOC_DIR)
+
+    # Files that blew their extraction budget before are skipped until they change
+    quarantine = Quarantine() if retry_quarantined else Quarantine.load(EMBEDDING_DIR)
+    doc_files = [p for p in scan.files if not quarantine.blocks(p, scan.stats.get(p))]
+    if len(doc_files) < len(scan.files):
+        print(f"🚧 Skipping {len(scan.files) - len(doc_files)} quarantined file(s) "
+              f"(see {EMBEDDING_DIR}/quarantine.json, or use --retry-quarantined)")
+
+    # Only re-index what changed since the last build, unless asked for a full rebuild
+    manifest = BuildManifest.load(EMBEDDING_DIR)
+    index_exists = os.path.exists(os.path.join(EMBEDDING_DIR, "index.faiss"))
+    incremental = not full and index_exists and bool(manifest.entries)
+
+    if incremental and not doc_files:
+        print("❌ No documents found - refusing to empty the existing index.")
+        print("💡 Check the 'data/' directory, or run with --full to rebuild from scratch.")
+        return
+
+    if incremental:
+        to_extract, deleted, current = manifest.diff(doc_files, scan.stats, scan.hashes)
+        if not to_extract and not deleted:
+            store_search_settings(params)
+            print("✅ Index is up to date - no documents changed since the last build.")
+            return
+        print(f"🔄 Incremental build: {len(to_extract)} new/changed, {len(deleted)} deleted, "
+              f"{len(current)} unchanged document(s)")
+    else:
+        to_extract, deleted, current = doc_files, [], {}
+
+    print("📄 Extracting, chunking and embedding documents (PDF, DOCX, XLSX, PPTX, etc.) in batches...")
+    os.makedirs(EMBEDDING_DIR, exist_ok=True)
+    # Duplicate and near-duplicate chunks are collapsed into one vector before embedding
+    dedup = NearDuplicateFilter(dedup_threshold) if dedup_threshold else None
+    # Chunk texts embedded by earlier builds are looked up instead of re-encoded
+    cache = open_embedding_cache(EMBED_CACHE_DIR) if embed_cache else None
+    encoder = ChunkEncoder(embed_batch_size, embed_workers, embed_threads)
+    # Without explicit settings, rebuilds keep the metric and index type of the last build
+    info = load_index_info(EMBEDDING_DIR) if index_exists else {}
+    metric = metric or info.get("metric", "l2")
+    params = params or info.get("index")
+    if incremental:
+        index, metadata = load_faiss_index(EMBEDDING_DIR)
+        db_path = os.path.join(EMBEDDING_DIR, METADATA_DB)
+        if not isinstance(metadata, MetadataStore) or not has_chunk_ids(db_path):
+            # Rows of older builds carry no id: it is their vector position
+            print("🔧 Migrating the metadata to stable chunk ids (one-time)...")
+            migrate_to_chunk_ids(db_path, metadata)
+            metadata = MetadataStore(db_path)
+        next_id = info.get("next_id", index.ntotal)
+        # metadata.db is edited in place: rows of changed and deleted documents
+        # are dropped and only the new chunks' rows inserted
+        updater = MetadataUpdater(db_path)
+        paths = [BuildManifest.key(p) for p in to_extract] + list(deleted)
+        stale, stale_ids = updater.affected(paths)
+        orphaned = stale - set(paths)
+        if stale_ids and not supports_removal(index):
+            # HNSW graphs can't drop nodes: rebuild with the embedding cache instead
+            print(f"♻️ {index_type(index)} indexes cannot drop vectors in place - rebuilding the whole index")
+            incremental = False
+            to_extract, deleted, current = doc_files, [], {}
+            updater.close()
+            metadata.close()
+            del index, metadata
+    if incremental:
+        existing = info.get("index") or {"type": index_type(index)}
+        if metric != index_metric(index) or build_settings_differ(existing, params):
+            print("⚠️ Keeping the existing index's metric, type and build settings "
+                  "(use --full to rebuild with new settings)")
+        if orphaned:
+            print(f"♻️ Also re-indexing {len(orphaned)} unchanged document(s) whose duplicate chunks "
+                  f"were merged into changed ones")
+            to_extract = to_extract + [Path(p) for p in sorted(orphaned)]
+        # Flat indexes of older builds number vectors by position; give them explicit ids
+        index = convert_to_stable_ids(index, index_metric(index), info.get("index"))
+        print(f"🗑️ Removing {len(stale_ids)} stale chunk(s) from the index...")
+        if stale_ids:
+            index.remove_ids(np.asarray(stale_ids, dtype="int64"))
+        if dedup:
+            # Kept rows are streamed from the store, one batch of them in memory at a time
+            removed = set(stale_ids)
+            dedup.seed((meta for meta in metadata if meta["id"] not in removed), next_id)
+        metadata.close()
+        updater.drop_duplicate_refs(stale)
+        writer = StreamingIndexWriter(EMBEDDING_DIR, index, updater, stale_ids, cache=cache, encoder=encoder,
+                                      params=with_search_settings(info.get("index"), params), next_id=next_id)
+    else:
+        writer = StreamingIndexWriter(EMBEDDING_DIR, cache=cache, encoder=encoder, metric=metric, params=params)
+
+    # Documents flow through extract -> chunk -> embed lazily, so only one
+    # batch of chunks is held in memory at a time
+    extracted = {}
+    counts = {"documents": 0, "chunks": 0, "truncated": 0}
+    tokenizer, max_tokens = None, None
+    if chunking == "tokens":
+        tokenizer, max_tokens = get_tokenizer()
+        if not getattr(tokenizer, "is_fast", False):
+            print("⚠️ The embedding model has no fast tokenizer - falling back to word-based chunking.")
+            tokenizer = None
+        else:
+            print(f"✂️ Chunking on the embedding model's {max_tokens}-token budget")
+
+    def embed_batch(batch):
+        # Token-budget chunks fit by construction; word chunks may not
+        if tokenizer is None:
+            counts["truncated"] += count_truncated([meta["text"] for meta in batch])
+        writer.add(batch)
+
+    # Extraction and chunking run in worker pools and embedding on a background
+    # thread, so all three stages overlap; bounded queues between them keep
+    # memory flat.
+    documents = iter_documents(loader, to_extract, workers, extracted)
+    records = iter_chunk_records(documents, counts, tokenizer, max_tokens, workers)
+    if dedup:
+        records = dedup.filter(records)
+    embedding = BackgroundStage(embed_batch, name="embedding")
+    try:
+        for batch in iter_batches(records, batch_size):
+            embedding.put(batch)
+        embedding.close()
+    except BaseException:
+        embedding.cancel()
+        writer.abort()
+        raise
+
+    for file_path, outcome in loader.stats.quarantined.items():
+        quarantine.add(file_path, outcome["quarantine"], outcome["seconds"])
+    quarantine.save(EMBEDDING_DIR)
+
+    if counts["documents"] == 0 and not incremental:
+        writer.abort()
         print("❌ No valid documents found or processed!")
         print("💡 Make sure you have supported document files in the 'data/' directory.")
         print("📋 Supported formats: PDF, DOCX, DOC, XLSX, XLS, PPTX, PPT")
         print("📋 Current data directory contents:")
         data_path = Path(DOC_DIR)
         if data_path.exists():
-            loader = DocumentLoader()
             supported_exts = list(loader.SUPPORTED_EXTENSIONS.keys())
             for file_path in data_path.iterdir():
                 if file_path.is_file():
@@ -30,38 +261,59 @@ def run_build_pipeline():
                     print(f"   {file_path.name}: {size} bytes - {status}")
         return
 
-    all_chunks = []
-    all_meta = []
-
-    for filename, text, page_metadata in raw_docs:
-        print(f"✂️ Chunking {filename} with page tracking...")
-        chunks_with_meta = chunk_text_with_metadata(text, page_metadata)
-        
-        for chunk_info in chunks_with_meta:
-            all_chunks.append(chunk_info["text"])
-            all_meta.append({
-                "source": filename,
-                "text": chunk_info["text"],
-                "pages": chunk_info["pages"],
-                "char_start": chunk_info["char_start"],
-                "char_end": chunk_info["char_end"]
-            })
-
-    if not all_chunks:
+    if counts["chunks"] == 0 and not incremental:
+        writer.abort()
         print("❌ No text chunks created! Documents may not contain extractable text.")
         return
 
-    os.makedirs(EMBEDDING_DIR, exist_ok=True)
-    print("🔗 Building FAISS index...")
-    build_faiss_index(all_chunks, all_meta, EMBEDDING_DIR)
+    if counts["truncated"]:
+        print(f"✂️ {counts['truncated']} embedded chunk(s) exceed the model's sequence limit and were "
+              f"truncated (use --chunking tokens to size chunks to the model)")
+    if dedup:
+        print(f"🧬 Collapsed {dedup.exact_duplicates} exact and {dedup.near_duplicates} near-duplicate chunk(s)")
+    writer.close(dedup.duplicate_refs if dedup else None)
+    current.update(extracted)
+    BuildManifest(current).save(EMBEDDING_DIR)
+
+    # Chunks are counted before de-duplication; only the kept ones were embedded
+    dropped = counts["chunks"] - writer.added
+    print(f"✅ Embedding complete and index saved ({writer.added} new chunk(s) from {counts['documents']} "
+          f"document(s){f', {dropped} duplicate chunk(s) dropped' if dropped else ''}).")
+
 
-    print("✅ Embedding complete and index saved.")
+def edit_documents(add_path: str = None, remove_source: str = None, chunking: str = "words",
+                   extract_cache: bool = True, embed_cache: bool = True):
+    """Remove and/or add single documents in place, without a build over data/"""
+    if not os.path.exists(os.path.join(EMBEDDING_DIR, "index.faiss")):
+        print("❌ No embeddings found! Please run with --build first to index your documents.")
+        return
+    started = time.perf_counter()
+    editor = IndexEditor(EMBEDDING_DIR, chunking=chunking, extract_cache=extract_cache, embed_cache=embed_cache)
+    try:
+        if remove_source:
+            removed = editor.remove_document(remove_source)
+            print(f"🗑️ Removed {remove_source} ({removed} chunk(s))")
+        if add_path:
+            added = editor.add_document(add_path)
+            print(f"➕ Indexed {add_path} ({added} chunk(s))")
+        editor.save()
+    except (ValueError, FileNotFoundError) as e:
+        print(f"❌ {e} - the index was left unchanged.")
+        return
+    finally:
+        editor.close()
+    print(f"✅ Index updated in {time.perf_counter() - started:.1f}s ({editor.index.ntotal} vector(s)).")
 
 
-def ask_question(query: str, top_k: int = 5):
+def ask_question(query: str, top_k: int = 5, min_score: float = None, nprobe: int = None, ef_search: int = None):
     print("🔍 Retrieving relevant context...")
-    index, metadata = load_faiss_index(EMBEDDING_DIR)
-    relevant_chunks = retrieve(query, index, metadata, k=top_k)
+    # Read-only: memory-map rather than read the whole index
+    index, metadata = load_faiss_index(EMBEDDING_DIR, mmap=True)
+    relevant_chunks = retrieve(query, index, metadata, k=top_k, min_score=min_score, nprobe=nprobe, ef_search=ef_search)
+    if not relevant_chunks:
+        if min_score is not None:
+            return f"No indexed passages scored above {min_score} for this question - try rephrasing or lowering --min-score."
+        return "The index returned no passages for this question - check that documents were indexed with --build."
 
     print("💬 Generating detailed answer with references...")
     answer = generate_detailed_answer(query, relevant_chunks)
@@ -86,7 +338,7 @@ def ask_question(query: str, top_k: int = 5):
     return answer + sources_summary
 
 
-def interactive_chat():
+def interactive_chat(min_score: float = None, nprobe: int = None, ef_search: int = None):
     """
     Interactive chat mode - continuously waits for user questions
     and provides detailed answers with references until the program is killed (Ctrl+C).
@@ -105,6 +357,9 @@ def interactive_chat():
     if not os.path.exists(os.path.join(EMBEDDING_DIR, "index.faiss")):
         print("❌ No embeddings found! Please run with --build first to index your documents.")
         return
+
+    # Load the embedding model while the user types the first question
+    preload_model(background=True)
     
     try:
         while True:
@@ -120,7 +375,7 @@ def interactive_chat():
             # Process the query
             try:
                 print("🔄 Processing your question...")
-                response = ask_question(user_query, top_k=7)  # Get more context for detailed answers
+                response = ask_question(user_query, top_k=7, min_score=min_score, nprobe=nprobe, ef_search=ef_search)  # Get more context for detailed answers
                 print(f"\n🧠 **Detailed Answer:**\n{response}")
                 
                 # Optional: Show relevance information
@@ -139,18 +394,63 @@ if __name__ == "__main__":
 
     parser = argparse.ArgumentParser(description="Ask questions from your local documents (PDF, DOCX, XLSX, PPTX, etc.) using RAG + Ollama.")
     parser.add_argument("--build", action="store_true", help="Run the indexing pipeline on documents.")
+    parser.add_argument("--add", type=str, metavar="FILE", help="Index one document in place, replacing its previous version if it is already indexed.")
+    parser.add_argument("--remove", type=str, metavar="SOURCE", help="Remove one document, by path or file name, from the index in place (a later --build re-adds it if it is still in data/).")
     parser.add_argument("--ask", type=str, help="Ask a single question based on the indexed documents.")
     parser.add_argument("--chat", action="store_true", help="Start interactive chat mode (default if no other option is provided).")
+    parser.add_argument("--full", action="store_true", help="With --build, ignore the build manifest and re-index every document.")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="Number of chunks embedded and written per step of --build.")
+    parser.add_argument("--no-extract-cache", action="store_true", help=f"With --build, re-parse every document instead of reusing text cached in {EXTRACT_CACHE_DIR}/.")
+    parser.add_argument("--no-embed-cache", action="store_true", help=f"With --build, re-encode every chunk instead of reusing vectors cached in {EMBED_CACHE_DIR}/.")
+    parser.add_argument("--embed-batch-size", type=int, default=ENCODE_BATCH_SIZE, help="Chunks per forward pass of the embedding model during --build.")
+    parser.add_argument("--embed-workers", type=int, default=1, help="Embedding processes for --build, each with its own model copy (0 = one per CPU core).")
+    parser.add_argument("--embed-threads", type=int, help="Torch or ONNX Runtime threads per embedding process (default: CPU cores divided among --embed-workers).")
+    parser.add_argument("--dedup-threshold", type=float, default=DEFAULT_THRESHOLD, help="Estimated Jaccard similarity above which chunks are collapsed into one vector (0 disables de-duplication).")
+    parser.add_argument("--file-timeout", type=float, default=FILE_TIME_LIMIT, help="Wall-clock budget in seconds for extracting one file during --build (0 = no limit).")
+    parser.add_argument("--file-memory-mb", type=float, default=FILE_MEMORY_LIMIT_MB, help="Memory budget in MB for extracting one file during --build (0 = no limit).")
+    parser.add_argument("--retry-quarantined", action="store_true", help="With --build, retry files quarantined by earlier builds.")
+    parser.add_argument("--chunking", choices=CHUNKING_MODES, default="words", help="Size chunks in words or in the embedding model's tokens (switching modes needs --full).")
+    parser.add_argument("--workers", type=int, default=1, help="Number of document extraction and chunking processes for --build (0 = one per CPU core).")
+    parser.add_argument("--metric", choices=METRICS, help="With --build, index raw vectors by L2 distance or normalized vectors by cosine similarity (default: the existing index's, else l2; switching needs --full).")
+    parser.add_argument("--index-type", choices=INDEX_TYPES, help="With --build, exact flat search or approximate IVF-Flat, IVF-PQ or HNSW (default: the existing index's, else flat; switching needs --full).")
+    parser.add_argument("--nlist", type=int, help="Inverted lists of ivf_flat/ivf_pq indexes (trained on nlist * 64 sample vectors).")
+    parser.add_argument("--pq-m", type=int, help="Sub-quantizers per vector of ivf_pq indexes; must divide the vector dimension.")
+    parser.add_argument("--hnsw-m", type=int, help="Graph neighbours per vector of hnsw indexes.")
+    parser.add_argument("--nprobe", type=int, help="Inverted lists scanned per query of IVF indexes (stored as the default with --build, without a rebuild).")
+    parser.add_argument("--ef-search", type=int, help="Candidates explored per query of hnsw indexes (stored as the default with --build, without a rebuild).")
+    parser.add_argument("--storage", choices=STORAGE_TYPES, help="With --build, store vectors as float32, float16 or 8-bit scalar-quantized codes (flat, ivf_flat and hnsw; 2x / 4x smaller).")
+    parser.add_argument("--rescore", type=int, nargs="?", const=DEFAULT_RESCORE_FACTOR, metavar="FACTOR", help=f"With --build, keep float32 vectors on disk and re-score FACTOR x top-k compressed candidates exactly at query time (default factor {DEFAULT_RESCORE_FACTOR}).")
+    parser.add_argument("--min-score", type=float, help="Drop retrieved chunks scoring below this before answering (cosine similarity on cosine indexes).")
+    parser.add_argument("--backend", choices=EMBEDDING_BACKENDS, default=DEFAULT_BACKEND, help="Embedding backend: PyTorch, or the int8 ONNX export from src/onnx_backend.py --export.")
 
     args = parser.parse_args()
+    configure_model(backend=args.backend)
 
     if args.build:
-        run_build_pipeline()
+        params = None
+        if any(value is not None for value in (args.index_type, args.storage, args.rescore, args.nlist, args.pq_m,
+                                               args.hnsw_m, args.nprobe, args.ef_search)):
+            try:
+                params = requested_index_params(load_index_info(EMBEDDING_DIR).get("index"), args.index_type,
+                                                args.storage, args.rescore, nlist=args.nlist, pq_m=args.pq_m,
+                                                hnsw_m=args.hnsw_m, nprobe=args.nprobe, ef_search=args.ef_search)
+            except ValueError as e:
+                parser.error(str(e))
+        run_build_pipeline(workers=args.workers, full=args.full, batch_size=args.batch_size,
+                           extract_cache=not args.no_extract_cache, dedup_threshold=args.dedup_threshold,
+                           time_limit=args.file_timeout or None, memory_limit_mb=args.file_memory_mb or None,
+                           retry_quarantined=args.retry_quarantined, chunking=args.chunking,
+                           embed_cache=not args.no_embed_cache, embed_batch_size=args.embed_batch_size,
+                           embed_workers=args.embed_workers, embed_threads=args.embed_threads,
+                           metric=args.metric, params=params)
+    elif args.add or args.remove:
+        edit_documents(args.add, args.remove, chunking=args.chunking, extract_cache=not args.no_extract_cache,
+                       embed_cache=not args.no_embed_cache)
     elif args.ask:
-        response = ask_question(args.ask)
+        response = ask_question(args.ask, min_score=args.min_score, nprobe=args.nprobe, ef_search=args.ef_search)
         print(f"\n🧠 Answer:\n{response}")
     elif args.chat:
-        interactive_chat()
+        interactive_chat(args.min_score, args.nprobe, args.ef_search)
     else:
         # Default to interactive chat mode if no arguments provided
-        interactive_chat()
+        interactive_chat(args.min_score, args.nprobe, args.ef_search)
@@ -1,119 +1,251 @@
+import re
+from bisect import bisect_left, bisect_right
+from itertools import accumulate
+from typing import Iterator, Tuple
+
+# Lines that open a list; a chunk that is already well filled ends before them
+LIST_MARKERS = ('•', '-', '1.', '2.', '3.', 'a)', 'b)', 'c)')
+
+# Whitespace that follows the end of a sentence
+_SENTENCE_BREAK = re.compile(r'(?<=[.!?])\s+')
+# A word, as str.split() counts them
+_WORD = re.compile(r'\S+')
+
+# Tokens shared between consecutive chunks in token-budget mode
+TOKEN_OVERLAP = 32
+
+
+def _page_ref(page_info: dict):
+    """Handle different metadata structures from different document types"""
+    return (page_info.get("page_number") or
+            page_info.get("paragraph_number") or
+            page_info.get("sheet_name") or
+            page_info.get("slide_number") or
+            "Unknown")
+
+
+class PageIndex:
+    """
+    Interval index over page_metadata for mapping character spans to units.
+
+    Units (pages, paragraphs, sheets or slides) are kept sorted by char_start
+    with a running maximum of char_end, so the first unit that can overlap a
+    span is found with a binary search and only overlapping units are visited.
+    The running maximum keeps lookups correct even if unit ends are not
+    monotonic.
+    """
+
+    def __init__(self, page_metadata: list[dict]):
+        units = page_metadata
+        if any(units[i]["char_start"] > units[i + 1]["char_start"] for i in range(len(units) - 1)):
+            units = sorted(units, key=lambda page_info: page_info["char_start"])
+        self._starts = [page_info["char_start"] for page_info in units]
+        self._ends = [page_info["char_end"] for page_info in units]
+        self._refs = [_page_ref(page_info) for page_info in units]
+        self._max_ends = list(accumulate(self._ends, max))
+
+    def pages_for_span(self, chunk_start: int, chunk_end: int) -> list:
+        """Find which pages a chunk spans"""
+        chunk_pages = []
+        i = bisect_right(self._max_ends, chunk_start)
+        while i < len(self._starts) and self._starts[i] < chunk_end:
+            if self._ends[i] > chunk_start:
+                page_ref = self._refs[i]
+                # Large sheets are split into several row units with the same name
+                if not chunk_pages or chunk_pages[-1] != page_ref:
+                    chunk_pages.append(page_ref)
+            i += 1
+        return chunk_pages
+
+
+def iter_sentence_spans(text: str) -> Iterator[Tuple[int, int]]:
+    """
+    Yield (start, end) character offsets of the sentences in text.
+
+    A single pass of a compiled regex finds the whitespace after each
+    sentence-ending punctuation mark; no substrings are created. Offsets are
+    exact however much whitespace separates sentences.
+    """
+    start = 0
+    for match in _SENTENCE_BREAK.finditer(text):
+        yield start, match.start()
+        start = match.end()
+    if start < len(text):
+        yield start, len(text)
+
+
+def _overlap_start(text: str, spans: list, overlap_tokens: int) -> int:
+    """
+    Offset of the first of the last overlap_tokens words covered by spans.
+
+    spans holds (start, end, word_count) for the sentences of a chunk; only
+    the sentence where the overlap begins is scanned for word offsets.
+    """
+    covered = 0
+    for start, end, count in reversed(spans):
+        covered += count
+        if covered >= overlap_tokens:
+            skip = covered - overlap_tokens
+            for i, match in enumerate(_WORD.finditer(text, start, end)):
+                if i == skip:
+                    return match.start()
+    return spans[0][0]
+
+
 def chunk_text_with_metadata(text: str, page_metadata: list[dict], max_tokens: int = 512, overlap_tokens: int = 50) -> list[dict]:
     """
     Chunk text while preserving page number information with improved chunking strategy.
-    
+
+    Sentences are taken as spans of the document and chunk text is sliced from
+    it once per chunk, so char_start/char_end are exact. Token counts are kept
+    as running totals and the overlap starts on a word boundary.
+
     Args:
         text: The text to chunk
         page_metadata: Metadata about page boundaries
         max_tokens: Maximum tokens per chunk (increased from 256 to 512)
         overlap_tokens: Number of tokens to overlap between chunks for context continuity
-    
+
     Returns:
         List of chunk dictionaries with metadata.
     """
-    import re
-    
-    # Split on sentence boundaries but also consider paragraph breaks
-    sentences = re.split(r'(?<=[.!?])\s+', text)
+    page_index = PageIndex(page_metadata)
     chunks = []
-    current_chunk = []
-    current_char_pos = 0
-    
-    for i, sentence in enumerate(sentences):
-        current_chunk.append(sentence)
-        sentence_length = len(sentence) + 1  # +1 for space
-        
-        current_token_count = len(" ".join(current_chunk).split())
-        
+    current_spans = []
+    current_token_count = 0
+
+    # Split on sentence boundaries but also consider paragraph breaks
+    spans = iter_sentence_spans(text)
+    next_span = next(spans, None)
+    while next_span is not None:
+        start, end = next_span
+        next_span = next(spans, None)
+        # Counted on the span in place, without slicing the sentence out
+        sentence_tokens = sum(1 for _ in _WORD.finditer(text, start, end))
+        current_spans.append((start, end, sentence_tokens))
+        current_token_count += sentence_tokens
+
         # Create chunk when we exceed max_tokens or reach a natural break
         should_chunk = (
-            current_token_count > max_tokens or 
+            current_token_count > max_tokens or
             (current_token_count > max_tokens * 0.7 and  # At least 70% full
-             i < len(sentences) - 1 and  # Not the last sentence
-             (sentences[i+1].strip().startswith(('•', '-', '1.', '2.', '3.', 'a)', 'b)', 'c)')) or  # Next sentence starts a list
-              sentence.endswith((':')) or  # Current sentence ends with colon (likely introduces a list)
-              len(sentences[i+1]) > 100))  # Next sentence is substantial (new topic)
+             next_span is not None and  # Not the last sentence
+             (text.startswith(LIST_MARKERS, next_span[0], next_span[1]) or  # Next sentence starts a list
+              text.endswith(':', start, end) or  # Current sentence ends with colon (likely introduces a list)
+              next_span[1] - next_span[0] > 100))  # Next sentence is substantial (new topic)
         )
-        
+
         if should_chunk:
-            chunk_text = " ".join(current_chunk)
-            chunk_start = current_char_pos - len(chunk_text)
-            chunk_end = current_char_pos
-            
-            # Find which pages this chunk spans
-            chunk_pages = []
-            for page_info in page_metadata:
-                if (chunk_start < page_info["char_end"] and 
-                    chunk_end > page_info["char_start"]):
-                    # Handle different metadata structures from different document types
-                    page_ref = (page_info.get("page_number") or 
-                               page_info.get("paragraph_number") or 
-                               page_info.get("sheet_name") or 
-                               page_info.get("slide_number") or 
-                               "Unknown")
-                    chunk_pages.append(page_ref)
-            
+            chunk_start = current_spans[0][0]
             chunks.append({
-                "text": chunk_text,
-                "pages": chunk_pages,
+                "text": text[chunk_start:end],
+                "pages": page_index.pages_for_span(chunk_start, end),
                 "char_start": chunk_start,
-                "char_end": chunk_end
+                "char_end": end
             })
-            
+
             # Create overlap for context continuity
-            if overlap_tokens > 0 and current_chunk:
-                overlap_words = " ".join(current_chunk).split()
-                if len(overlap_words) > overlap_tokens:
-                    overlap_text = " ".join(overlap_words[-overlap_tokens:])
-                    current_chunk = [overlap_text]
-                else:
-                    current_chunk = []
+            if overlap_tokens > 0 and current_token_count > overlap_tokens:
+                current_spans = [(_overlap_start(text, current_spans, overlap_tokens), end, overlap_tokens)]
+                current_token_count = overlap_tokens
             else:
-                current_chunk = []
-        
-        current_char_pos += sentence_length
-    
+                current_spans = []
+                current_token_count = 0
+
     # Handle remaining chunk
-    if current_chunk:
-        chunk_text = " ".join(current_chunk)
-        chunk_start = current_char_pos - len(chunk_text)
-        chunk_end = current_char_pos
-        
-        chunk_pages = []
-        for page_info in page_metadata:
-            if (chunk_start < page_info["char_end"] and 
-                chunk_end > page_info["char_start"]):
-                # Handle different metadata structures from different document types
-                page_ref = (page_info.get("page_number") or 
-                           page_info.get("paragraph_number") or 
-                           page_info.get("sheet_name") or 
-                           page_info.get("slide_number") or 
-                           "Unknown")
-                chunk_pages.append(page_ref)
-        
+    if current_spans:
+        chunk_start, chunk_end = current_spans[0][0], current_spans[-1][1]
         chunks.append({
-            "text": chunk_text,
-            "pages": chunk_pages,
+            "text": text[chunk_start:chunk_end],
+            "pages": page_index.pages_for_span(chunk_start, chunk_end),
             "char_start": chunk_start,
             "char_end": chunk_end
         })
-    
+
+    return chunks
+
+
+def chunk_text_by_tokens(text: str, page_metadata: list[dict], tokenizer, max_tokens: int,
+                         overlap_tokens: int = TOKEN_OVERLAP) -> list[dict]:
+    """
+    Chunk text on the embedding model's own token budget.
+
+    The whole document is tokenized once with a fast tokenizer; its offset
+    mapping gives the exact character span of every token. Chunks are packed
+    greedily up to max_tokens, ending at the last sentence boundary that fits,
+    or mid-sentence when a single sentence is longer than the budget. The
+    overlap with the previous chunk starts on a word boundary.
+
+    Args:
+        text: The text to chunk
+        page_metadata: Metadata about page boundaries
+        tokenizer: Fast (Rust-backed) Hugging Face tokenizer of the embedding model
+        max_tokens: Token budget per chunk, excluding special tokens
+        overlap_tokens: Number of tokens to overlap between chunks for context continuity
+
+    Returns:
+        List of chunk dictionaries with metadata, as chunk_text_with_metadata.
+    """
+    encoding = tokenizer(text, add_special_tokens=False, return_offsets_mapping=True,
+                         return_attention_mask=False, return_token_type_ids=False, verbose=False)
+    offsets = encoding["offset_mapping"]
+    if not offsets:
+        return []
+    word_ids = encoding.word_ids()
+    token_starts = [start for start, _ in offsets]
+    total = len(offsets)
+
+    # Token index of the first token of every sentence after the first
+    breaks = []
+    for sentence_start, _ in iter_sentence_spans(text):
+        token = bisect_left(token_starts, sentence_start)
+        if 0 < token < total and (not breaks or breaks[-1] != token):
+            breaks.append(token)
+
+    page_index = PageIndex(page_metadata)
+    chunks = []
+    start = 0
+    while start < total:
+        if total - start <= max_tokens:
+            end = total
+        else:
+            candidate = bisect_right(breaks, start + max_tokens) - 1
+            end = breaks[candidate] if candidate >= 0 and breaks[candidate] > start else start + max_tokens
+
+        char_start = offsets[start][0]
+        char_end = offsets[end - 1][1]
+        chunks.append({
+            "text": text[char_start:char_end],
+            "pages": page_index.pages_for_span(char_start, char_end),
+            "char_start": char_start,
+            "char_end": char_end
+        })
+        if end == total:
+            break
+
+        # Step back for the overlap, then forward to the start of a word
+        next_start = max(end - overlap_tokens, start + 1)
+        while next_start < end and word_ids[next_start] is not None and word_ids[next_start] == word_ids[next_start - 1]:
+            next_start += 1
+        start = next_start
+
     return chunks
 
 
 def chunk_text(text: str, max_tokens: int = 512) -> list[str]:
     """Legacy function for backward compatibility with improved chunk size"""
-    import re
-
-    sentences = re.split(r'(?<=[.!?])\s+', text)
+    sentences = _SENTENCE_BREAK.split(text)
     chunks = []
     current_chunk = []
+    current_token_count = 0
 
     for sentence in sentences:
         current_chunk.append(sentence)
-        if len(" ".join(current_chunk).split()) > max_tokens:
+        current_token_count += len(sentence.split())
+        if current_token_count > max_tokens:
             chunks.append(" ".join(current_chunk))
             current_chunk = []
+            current_token_count = 0
 
     if current_chunk:
         chunks.append(" ".join(current_chunk))
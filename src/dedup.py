@@ -0,0 +1,111 @@
+import hashlib
+import zlib
+from collections import defaultdict
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+import numpy as np
+
+# MinHash signature length and LSH banding (8 bands x 8 rows). With these
+# settings pairs above ~0.8 Jaccard similarity almost always share a bucket;
+# candidates are then verified against the actual threshold.
+NUM_PERMUTATIONS = 64
+NUM_BANDS = 8
+SHINGLE_SIZE = 5
+DEFAULT_THRESHOLD = 0.9
+
+_MERSENNE_PRIME = np.uint64((1 << 31) - 1)
+_rng = np.random.RandomState(1)
+_PERM_A = _rng.randint(1, (1 << 31) - 1, size=NUM_PERMUTATIONS).astype(np.uint64)
+_PERM_B = _rng.randint(0, (1 << 31) - 1, size=NUM_PERMUTATIONS).astype(np.uint64)
+
+
+def _normalize(text: str) -> List[str]:
+    return text.lower().split()
+
+
+def minhash_signature(words: List[str], shingle_size: int = SHINGLE_SIZE) -> np.ndarray:
+    """MinHash signature over the word shingles of a chunk"""
+    if len(words) <= shingle_size:
+        shingles = {" ".join(words)}
+    else:
+        shingles = {" ".join(words[i:i + shingle_size]) for i in range(len(words) - shingle_size + 1)}
+    # crc32 keeps shingle hashes below 2^32, so a * x + b cannot overflow uint64
+    hashes = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles), dtype=np.uint64, count=len(shingles))
+    permuted = (_PERM_A[:, None] * hashes[None, :] + _PERM_B[:, None]) % _MERSENNE_PRIME
+    return permuted.min(axis=1).astype(np.uint32)
+
+
+class NearDuplicateFilter:
+    """
+    Collapse duplicate and near-duplicate chunks before they are embedded.
+
+    Exact duplicates (after case and whitespace normalization) are caught with a
+    content hash; near duplicates with MinHash + LSH. A duplicate chunk is not
+    emitted: instead its source, path and pages are recorded against the chunk
+    id of the chunk it duplicates, in `duplicate_refs`, so the index keeps
+    every source reference while storing one vector. Emitted chunks are
+    numbered from next_id on, in the order the index writer assigns ids.
+    """
+
+    def __init__(self, threshold: float = DEFAULT_THRESHOLD):
+        self.threshold = threshold
+        self.next_id = 0
+        self.duplicate_refs: Dict[int, List[Dict]] = defaultdict(list)
+        self.exact_duplicates = 0
+        self.near_duplicates = 0
+        self._exact: Dict[bytes, int] = {}
+        self._buckets: Dict[Tuple[int, bytes], int] = {}
+        self._signatures: Dict[int, np.ndarray] = {}
+
+    def _find(self, words: List[str]) -> Tuple[int, bytes, np.ndarray]:
+        """Return (matching chunk id or -1, exact key, signature)"""
+        exact_key = hashlib.blake2b(" ".join(words).encode("utf-8"), digest_size=16).digest()
+        if exact_key in self._exact:
+            return self._exact[exact_key], exact_key, None
+
+        signature = minhash_signature(words)
+        rows = NUM_PERMUTATIONS // NUM_BANDS
+        for band in range(NUM_BANDS):
+            candidate = self._buckets.get((band, signature[band * rows:(band + 1) * rows].tobytes()))
+            if candidate is not None:
+                similarity = float(np.mean(self._signatures[candidate] == signature))
+                if similarity >= self.threshold:
+                    return candidate, exact_key, signature
+        return -1, exact_key, signature
+
+    def _remember(self, chunk_id: int, exact_key: bytes, signature: np.ndarray):
+        self._exact[exact_key] = chunk_id
+        self._signatures[chunk_id] = signature
+        rows = NUM_PERMUTATIONS // NUM_BANDS
+        for band in range(NUM_BANDS):
+            self._buckets.setdefault((band, signature[band * rows:(band + 1) * rows].tobytes()), chunk_id)
+
+    def seed(self, metadatas: Iterable[Dict], next_id: int):
+        """Register chunks already in the index under their ids; new chunks get ids from next_id on"""
+        for meta in metadatas:
+            words = _normalize(meta["text"])
+            exact_key = hashlib.blake2b(" ".join(words).encode("utf-8"), digest_size=16).digest()
+            self._remember(meta["id"], exact_key, minhash_signature(words))
+        self.next_id = next_id
+
+    def filter(self, records: Iterable[Dict]) -> Iterator[Dict]:
+        """Yield only the chunk records that are not duplicates of an earlier chunk"""
+        for record in records:
+            words = _normalize(record["text"])
+            match, exact_key, signature = self._find(words)
+            if match >= 0:
+                if signature is None:
+                    self.exact_duplicates += 1
+                else:
+                    self.near_duplicates += 1
+                self.duplicate_refs[match].append({
+                    "source": record["source"],
+                    "path": record.get("path"),
+                    "pages": record["pages"],
+                })
+                continue
+
+            self._remember(self.next_id, exact_key, signature)
+            self.next_id += 1
+            yield record
+
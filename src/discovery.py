@@ -0,0 +1,133 @@
+import os
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple
+
+from manifest import file_sha256
+
+# File types the document loader can extract
+DOCUMENT_EXTENSIONS = ('.pdf', '.docx', '.doc', '.xlsx', '.xls', '.pptx', '.ppt')
+
+# Files smaller than this are empty or truncated and are skipped
+MIN_FILE_SIZE = 50
+
+
+class CorpusScan:
+    """
+    Result of one walk over a document tree.
+
+    Attributes:
+        files: Unique documents to index, sorted by path
+        duplicates: Byte-identical copies, mapped to the file in `files` they duplicate
+        skipped: (path, reason) for files rejected by the size filters
+        stats: os.stat_result for every accepted file, keyed by path
+        hashes: SHA-256 of files that had to be hashed for duplicate detection
+    """
+
+    def __init__(self):
+        self.files: List[Path] = []
+        self.duplicates: Dict[Path, Path] = {}
+        self.skipped: List[Tuple[Path, str]] = []
+        self.stats: Dict[Path, os.stat_result] = {}
+        self.hashes: Dict[Path, str] = {}
+
+
+def _walk_files(root: Path) -> Iterable[os.DirEntry]:
+    """Yield every regular file under root with a single recursive scandir pass"""
+    pending = [root]
+    while pending:
+        directory = pending.pop()
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        pending.append(entry.path)
+                    elif entry.is_file():
+                        yield entry
+        except OSError as e:
+            print(f"⚠️ Cannot read directory {directory}: {e}")
+
+
+def discover_documents(doc_dir: str, extensions: Iterable[str] = DOCUMENT_EXTENSIONS,
+                       min_size: int = MIN_FILE_SIZE, max_size: int = None,
+                       detect_duplicates: bool = True) -> CorpusScan:
+    """
+    Walk doc_dir once and collect the documents worth indexing.
+
+    Files are filtered by extension (case-insensitive) and size. Byte-identical
+    files are detected by hashing only the files whose sizes collide, so each
+    distinct document is indexed once; the first path in sorted order wins.
+    """
+    scan = CorpusScan()
+    root = Path(doc_dir)
+    if not root.exists():
+        return scan
+
+    extensions = {ext.lower() for ext in extensions}
+    for entry in _walk_files(root):
+        path = Path(entry.path)
+        # Skip Office lock files such as "~$report.docx"
+        if path.suffix.lower() not in extensions or path.name.startswith("~$"):
+            continue
+        stat = entry.stat()
+        if stat.st_size < min_size:
+            scan.skipped.append((path, f"too small ({stat.st_size} bytes)"))
+            continue
+        if max_size is not None and stat.st_size > max_size:
+            scan.skipped.append((path, f"too large ({stat.st_size} bytes)"))
+            continue
+        scan.files.append(path)
+        scan.stats[path] = stat
+
+    scan.files.sort()
+    if not detect_duplicates:
+        return scan
+
+    by_size = defaultdict(list)
+    for path in scan.files:
+        by_size[scan.stats[path].st_size].append(path)
+
+    for same_size in by_size.values():
+        if len(same_size) < 2:
+            continue
+        first_with_hash = {}
+        for path in same_size:
+            try:
+                content_hash = file_sha256(path)
+            except OSError as e:
+                print(f"⚠️ Cannot read {path}: {e}")
+                continue
+            scan.hashes[path] = content_hash
+            if content_hash in first_with_hash:
+                scan.duplicates[path] = first_with_hash[content_hash]
+            else:
+                first_with_hash[content_hash] = path
+
+    if scan.duplicates:
+        scan.files = [path for path in scan.files if path not in scan.duplicates]
+    return scan
+
+
+_scan_cache = {}
+_scan_cache_lock = threading.Lock()
+
+
+def discover_documents_cached(doc_dir: str, max_age: float = 60.0) -> CorpusScan:
+    """
+    Cheap repeated discovery for status endpoints.
+
+    Skips duplicate hashing and reuses a scan of the same directory for up to
+    max_age seconds, so polling a network share does not walk it every time.
+    """
+    key = os.path.abspath(doc_dir)
+    now = time.monotonic()
+    with _scan_cache_lock:
+        cached = _scan_cache.get(key)
+        if cached and now - cached[0] < max_age:
+            return cached[1]
+    scan = discover_documents(doc_dir, detect_duplicates=False)
+    with _scan_cache_lock:
+        _scan_cache[key] = (now, scan)
+    return scan
@@ -1,9 +1,21 @@
 import fitz  # PyMuPDF for PDF
 from pathlib import Path
 import os
-from typing import List, Tuple, Dict, Any
+import heapq
+import multiprocessing
+import signal
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Tuple, Dict, Any, Iterable, Iterator
 import logging
 
+from discovery import CorpusScan, discover_documents
+from extraction_cache import NO_TEXT, ExtractionCache
+from manifest import file_sha256
+
 # Document-specific imports
 try:
     from docx import Document as DocxDocument
@@ -34,6 +46,245 @@ except ImportError:
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+
+def assemble_units(units: Iterable[Tuple[str, Any, str]], separator: str = "\n") -> Tuple[str, List[Dict]]:
+    """
+    Join extracted units (pages, paragraphs, sheets, slides) into one text buffer.
+
+    Takes (unit_key, unit_value, text) triples, e.g. ("page_number", 3, "..."), and
+    builds the document and its offsets in a single pass. A unit may carry a
+    fourth element, a dict of extra metadata fields. The page metadata only
+    records offsets; use page_text() to slice a unit's text back out of the buffer.
+
+    Returns: (full_text, page_metadata)
+    """
+    parts = []
+    page_metadata = []
+    offset = 0
+    for unit in units:
+        unit_key, unit_value, text = unit[:3]
+        parts.append(text)
+        parts.append(separator)
+        unit_info = {
+            unit_key: unit_value,
+            "char_start": offset,
+            "char_end": offset + len(text)
+        }
+        if len(unit) > 3:
+            unit_info.update(unit[3])
+        page_metadata.append(unit_info)
+        offset += len(text) + len(separator)
+    return "".join(parts), page_metadata
+
+
+def page_text(full_text: str, page_info: Dict) -> str:
+    """Return the text of one page_metadata entry"""
+    return full_text[page_info["char_start"]:page_info["char_end"]]
+
+
+def _iter_fitz_units(doc, unit_key: str) -> Iterator[Tuple[str, int, str]]:
+    """Yield (unit_key, page_number, text) for every page of a PyMuPDF document that has text"""
+    for page_num, page in enumerate(doc, 1):
+        page_text = page.get_text()
+        if page_text.strip():  # Only add non-empty pages
+            yield unit_key, page_num, page_text
+
+
+def _iter_sheet_units(sheet_name: str, rows: Iterable[Tuple[int, str]], rows_per_unit: int) -> Iterator[tuple]:
+    """
+    Group a sheet's rows into page-like units of at most rows_per_unit non-empty rows.
+
+    rows yields (row_number, row_text). Each unit records the spreadsheet rows it
+    covers, so only one batch of rows is held in memory at a time.
+    """
+    header = f"=== Sheet: {sheet_name} ===\n"
+    lines = [header]
+    row_start = row_end = None
+    emitted = False
+    for row_number, row_text in rows:
+        if not row_text.strip():
+            continue
+        if row_start is None:
+            row_start = row_number
+        row_end = row_number
+        lines.append(row_text + "\n")
+        if len(lines) - 1 >= rows_per_unit:
+            yield ("sheet_name", sheet_name, "".join(lines),
+                   {"row_start": row_start, "row_end": row_end, "rows": len(lines) - 1})
+            emitted = True
+            lines = [f"=== Sheet: {sheet_name} (continued) ===\n"]
+            row_start = None
+    
+    if len(lines) > 1 or not emitted:
+        yield ("sheet_name", sheet_name, "".join(lines),
+               {"row_start": row_start, "row_end": row_end, "rows": len(lines) - 1})
+
+
+def _rows_summary(page_metadata: List[Dict], seconds: float) -> str:
+    rows = sum(unit.get("rows", 0) for unit in page_metadata)
+    rate = rows / seconds if seconds > 0 else 0.0
+    return f"{len(page_metadata)} units, {rows} rows, {rate:.0f} rows/s"
+
+
+class ExtractionFailed(Exception):
+    """
+    Raised by an extractor that could not read a file: a parse error or a
+    missing optional dependency. Unlike a file without text, a failure is
+    never cached or recorded in the build manifest, so the file is retried.
+    """
+
+
+class ExtractionBudgetExceeded(BaseException):
+    """
+    Raised inside an extraction that ran over its time or memory budget.
+
+    Derives from BaseException so the extractors' `except Exception` handlers
+    cannot swallow it.
+    """
+
+
+def _current_rss() -> int or None:
+    """Resident set size of this process in bytes, or None where /proc is unavailable"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class _ExtractionBudget:
+    """
+    Enforce a wall-clock and memory budget on the code inside a with-block.
+
+    The time limit uses a SIGALRM interval timer; the memory limit a watchdog
+    thread that samples RSS growth over the level at entry and signals the main
+    thread when it goes over. The handler raises ExtractionBudgetExceeded the
+    next time the interpreter runs, so code stuck inside a native call is only
+    interrupted once it returns - which is why budgeted extractions run in
+    worker processes, and the parent kills workers stuck past the grace period.
+    Signals only work on the main thread (and not on Windows); elsewhere the
+    budget is not enforced.
+    """
+
+    POLL_SECONDS = 0.05
+
+    def __init__(self, time_limit: float = None, memory_limit_mb: float = None):
+        self.time_limit = time_limit
+        self.memory_limit = memory_limit_mb * 1024 * 1024 if memory_limit_mb else None
+        self.reason = None
+        self._enabled = (
+            (time_limit or memory_limit_mb)
+            and hasattr(signal, "setitimer")
+            and threading.current_thread() is threading.main_thread()
+        )
+        self._stop = threading.Event()
+
+    def _on_signal(self, signum, frame):
+        raise ExtractionBudgetExceeded(self.reason or f"exceeded {self.time_limit:.0f}s time limit")
+
+    def _watch_memory(self, baseline: int):
+        main_id = threading.main_thread().ident
+        while not self._stop.wait(self.POLL_SECONDS):
+            rss = _current_rss()
+            if rss is not None and rss - baseline > self.memory_limit:
+                self.reason = f"exceeded {self.memory_limit / 1024 / 1024:.0f} MB memory limit"
+                signal.pthread_kill(main_id, signal.SIGALRM)
+                return
+
+    def __enter__(self):
+        if not self._enabled:
+            return self
+        self._previous_handler = signal.signal(signal.SIGALRM, self._on_signal)
+        if self.time_limit:
+            signal.setitimer(signal.ITIMER_REAL, self.time_limit)
+        baseline = _current_rss() if self.memory_limit else None
+        self._watchdog = None
+        if baseline is not None:
+            self._watchdog = threading.Thread(target=self._watch_memory, args=(baseline,), daemon=True)
+            self._watchdog.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if not self._enabled:
+            return False
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        self._stop.set()
+        if self._watchdog:
+            self._watchdog.join()
+        signal.signal(signal.SIGALRM, self._previous_handler)
+        return False
+
+
+def _extraction_pool(workers: int) -> ProcessPoolExecutor:
+    # Spawned, not forked: pools are re-created mid-build, when the embedding
+    # thread may already hold torch locks that a forked child would inherit
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+def _kill_pool(executor: ProcessPoolExecutor):
+    """Hard-kill every worker of a pool whose task is stuck beyond interruption"""
+    # ProcessPoolExecutor has no public API for this; the pool is discarded afterwards
+    for process in list((executor._processes or {}).values()):
+        process.kill()
+
+
+class ExtractionStats:
+    """Per-format throughput counters for one extraction run"""
+
+    SLOWEST_FILES_REPORTED = 5
+
+    def __init__(self):
+        self.formats = defaultdict(lambda: {"files": 0, "pages": 0, "rows": 0, "seconds": 0.0, "failed": 0, "cached": 0})
+        self.wall_seconds = 0.0
+        self.timings = []
+        self.quarantined = {}
+
+    def record(self, file_path: Path, outcome: Dict):
+        entry = self.formats[file_path.suffix.lower()]
+        entry["files"] += 1
+        if not outcome["cached"]:
+            self.timings.append((outcome["seconds"], file_path))
+        if outcome.get("quarantine"):
+            self.quarantined[file_path] = outcome
+        if outcome["failed"]:
+            entry["failed"] += 1
+        elif outcome["cached"]:
+            # Cache hits say nothing about parser speed
+            entry["cached"] += 1
+        else:
+            entry["seconds"] += outcome["seconds"]
+            if outcome["result"]:
+                entry["pages"] += len(outcome["result"][2])
+                entry["rows"] += sum(unit.get("rows", 0) for unit in outcome["result"][2])
+
+    def log_summary(self):
+        """Log pages (and spreadsheet rows) per second for each format seen in this run"""
+        if not self.formats:
+            return
+        logger.info("📊 Extraction throughput:")
+        for ext, entry in sorted(self.formats.items()):
+            rate = entry["pages"] / entry["seconds"] if entry["seconds"] > 0 else 0.0
+            failed = f", {entry['failed']} failed" if entry["failed"] else ""
+            cached = f", {entry['cached']} from cache" if entry["cached"] else ""
+            rows = ""
+            if entry["rows"]:
+                row_rate = entry["rows"] / entry["seconds"] if entry["seconds"] > 0 else 0.0
+                rows = f", {entry['rows']} rows ({row_rate:.0f} rows/s)"
+            logger.info(f"   {ext}: {entry['files']} files, {entry['pages']} pages parsed in "
+                        f"{entry['seconds']:.1f}s ({rate:.1f} pages/s){rows}{cached}{failed}")
+        total_pages = sum(entry["pages"] for entry in self.formats.values())
+        if self.wall_seconds > 0:
+            logger.info(f"   overall: {total_pages} pages in {self.wall_seconds:.1f}s wall clock "
+                        f"({total_pages / self.wall_seconds:.1f} pages/s)")
+        slowest = heapq.nlargest(self.SLOWEST_FILES_REPORTED, self.timings, key=lambda timing: timing[0])
+        if slowest:
+            logger.info("🐢 Slowest files:")
+            for seconds, file_path in slowest:
+                logger.info(f"   {seconds:.1f}s  {file_path}")
+        for file_path, outcome in self.quarantined.items():
+            logger.warning(f"🚧 Quarantined {file_path}: {outcome['quarantine']}")
+
+
 class DocumentLoader:
     """
     A comprehensive document loader that supports multiple file formats:
@@ -53,8 +304,32 @@ class DocumentLoader:
         '.ppt': 'extract_ppt'
     }
     
-    def __init__(self):
+    # Bump whenever extractor output changes, so cached extractions are not reused
+    EXTRACTOR_VERSION = "4"
+    
+    # Spreadsheets are emitted as page-like units of this many non-empty rows
+    SPREADSHEET_ROWS_PER_UNIT = 200
+    
+    # Extra time given to a worker past its time limit before the parent kills it
+    HARD_KILL_GRACE_SECONDS = 30
+    
+    def __init__(self, cache_dir: str = None, time_limit: float = None, memory_limit_mb: float = None):
+        """
+        Args:
+            cache_dir: Directory for the extraction cache; None disables caching
+            time_limit: Wall-clock budget per file in seconds; None for no limit
+            memory_limit_mb: Memory growth budget per file in MB; None for no limit
+        """
         self._check_dependencies()
+        self.cache = ExtractionCache(cache_dir, self.EXTRACTOR_VERSION) if cache_dir else None
+        self.time_limit = time_limit
+        self.memory_limit_mb = memory_limit_mb
+        self.stats = ExtractionStats()
+
+    def __getstate__(self):
+        # Worker processes only need the extraction methods, the cache location
+        # and the budgets; run statistics stay with the parent loader.
+        return {"cache": self.cache, "time_limit": self.time_limit, "memory_limit_mb": self.memory_limit_mb}
     
     def _check_dependencies(self):
         """Check which optional dependencies are available"""
@@ -73,40 +348,192 @@ class DocumentLoader:
             logger.warning(f"Missing optional dependencies: {', '.join(missing_deps)}")
             logger.warning("Some file formats may not be supported. Install missing packages with pip.")
     
-    def extract_text_from_documents(self, doc_dir: str) -> List[Tuple[str, str, List[Dict]]]:
+    def extract_text_from_documents(self, doc_dir: str, workers: int = 1) -> List[Tuple[str, str, List[Dict]]]:
         """
         Extract text from documents in the specified directory.
+
+        Args:
+            doc_dir: Directory to scan recursively
+            workers: Number of extraction processes (1 = in-process, 0 = one per CPU core)
+
         Returns: list of (filename, full_text, page_metadata)
         """
         results = []
-        doc_dir = Path(doc_dir)
-        
-        if not doc_dir.exists():
-            logger.error(f"Directory does not exist: {doc_dir}")
+        supported_files = self.find_supported_files(doc_dir)
+        if not supported_files:
             return results
         
-        # Get all supported files recursively
-        supported_files = []
-        for ext in self.SUPPORTED_EXTENSIONS.keys():
-            # Use ** for recursive search through all subdirectories
-            supported_files.extend(doc_dir.glob(f"**/*{ext}"))
+        for file_path, result, failed in self.iter_extract_files(supported_files, workers=workers):
+            if result:
+                results.append(result)
         
-        if not supported_files:
-            logger.warning(f"No supported document files found in {doc_dir} (searched recursively)")
-            return results
+        return results
+
+    def scan_documents(self, doc_dir: str) -> CorpusScan:
+        """Walk doc_dir once, collecting unique supported files plus skipped and duplicate ones"""
+        if not Path(doc_dir).exists():
+            logger.error(f"Directory does not exist: {doc_dir}")
+            return CorpusScan()
         
-        logger.info(f"Found {len(supported_files)} supported document(s) to process")
+        scan = discover_documents(doc_dir, self.SUPPORTED_EXTENSIONS.keys())
+        for file_path, reason in scan.skipped:
+            logger.warning(f"Skipping {file_path.name}: {reason}")
+        for duplicate, original in scan.duplicates.items():
+            logger.info(f"Skipping duplicate {duplicate} (identical to {original})")
         
-        for file_path in supported_files:
-            try:
-                result = self._extract_from_file(file_path)
-                if result:
-                    results.append(result)
-            except Exception as e:
-                logger.error(f"Error processing {file_path.name}: {str(e)}")
-                continue
+        if not scan.files:
+            logger.warning(f"No supported document files found in {doc_dir} (searched recursively)")
+        else:
+            logger.info(f"Found {len(scan.files)} supported document(s) to process "
+                        f"({len(scan.duplicates)} duplicate(s) skipped)")
+        return scan
+
+    def find_supported_files(self, doc_dir: str) -> List[Path]:
+        """Return all unique supported document files under doc_dir, recursively and in sorted order"""
+        return self.scan_documents(doc_dir).files
+
+    def iter_extract_files(self, file_paths: Iterable[Path], workers: int = 1) -> Iterator[Tuple[Path, Any, bool]]:
+        """
+        Extract the given files, yielding (file_path, result, failed) in input order.
+
+        With workers > 1 files are parsed in a process pool. With a time or memory
+        limit they always are, on a single worker if need be, so a file stuck in
+        native code can be killed rather than stall the run. A file that raises or
+        crashes its worker yields a None result with failed set instead of
+        aborting the run; a file without extractable text yields None unfailed.
+        Throughput per format is collected in self.stats and logged at the end.
+        """
+        file_paths = [Path(p) for p in file_paths]
+        if workers is not None and workers <= 0:
+            workers = os.cpu_count() or 1
+
+        self.stats = ExtractionStats()
+        start = time.perf_counter()
+        if workers and workers > 1 and len(file_paths) > 1:
+            logger.info(f"Extracting with {workers} worker processes")
+            items = self._iter_parallel(file_paths, workers)
+        elif self.time_limit or self.memory_limit_mb:
+            items = self._iter_parallel(file_paths, 1)
+        else:
+            items = (self._timed_extract(file_path) for file_path in file_paths)
+
+        for file_path, outcome in zip(file_paths, items):
+            self.stats.record(file_path, outcome)
+            yield file_path, outcome["result"], outcome["failed"]
+
+        self.stats.wall_seconds = time.perf_counter() - start
+        self.stats.log_summary()
+
+    def _timed_extract(self, file_path: Path) -> Dict:
+        """
+        Extract one file and time it. Runs in worker processes.
+
+        Returns an outcome dict with the result, elapsed seconds, and whether the
+        file failed or was served from the extraction cache.
+        """
+        start = time.perf_counter()
+        outcome = {"result": None, "failed": False, "cached": False, "quarantine": None}
+        try:
+            with _ExtractionBudget(self.time_limit, self.memory_limit_mb):
+                if self.cache:
+                    outcome["result"], outcome["cached"] = self._extract_cached(file_path)
+                else:
+                    outcome["result"] = self._extract_from_file(file_path)
+        except ExtractionBudgetExceeded as e:
+            logger.error(f"❌ Giving up on {file_path.name}: {e}")
+            outcome.update(result=None, failed=True, quarantine=str(e))
+        except ExtractionFailed as e:
+            logger.error(f"❌ {e}")
+            outcome["failed"] = True
+        except Exception as e:
+            logger.error(f"Error processing {file_path.name}: {str(e)}")
+            outcome["failed"] = True
+        outcome["seconds"] = time.perf_counter() - start
+        return outcome
+
+    def _failed_outcome(self, quarantine: str = None, seconds: float = 0.0) -> Dict:
+        return {"result": None, "seconds": seconds, "failed": True, "cached": False, "quarantine": quarantine}
+
+    def _hard_timeout(self) -> float or None:
+        """How long the parent waits for a worker before killing it"""
+        return self.time_limit + self.HARD_KILL_GRACE_SECONDS if self.time_limit else None
+
+    def _extract_cached(self, file_path: Path) -> Tuple[Any, bool]:
+        """Extract through the cache, returning (result, cache_hit)"""
+        content_hash = file_sha256(file_path)
+        hit, cached = self.cache.get(content_hash)
+        if hit:
+            return (None if cached == NO_TEXT else (file_path.stem,) + tuple(cached)), True
         
-        return results
+        # Failures raise before reaching the cache, so they are retried next time
+        result = self._extract_from_file(file_path)
+        self.cache.put(content_hash, result[1:] if result else NO_TEXT)
+        return result, False
+
+    def _iter_parallel(self, file_paths: List[Path], workers: int) -> Iterator[Dict]:
+        """Run _timed_extract in a process pool, yielding outcomes in input order"""
+        queue = deque(file_paths)
+        in_flight = deque()
+        executor = _extraction_pool(workers)
+        try:
+            while queue or in_flight:
+                # Keep a bounded window of submitted files so results can be
+                # yielded in order without buffering the whole corpus.
+                while queue and len(in_flight) < workers * 2:
+                    file_path = queue.popleft()
+                    in_flight.append((file_path, executor.submit(self._timed_extract, file_path)))
+
+                # Tasks start in submission order, so the oldest one has been
+                # running at least as long as we wait for it here.
+                file_path, future = in_flight.popleft()
+                try:
+                    yield future.result(timeout=self._hard_timeout())
+                    continue
+                except FutureTimeoutError:
+                    # Stuck inside native code where the in-worker budget cannot
+                    # interrupt it: kill the pool and quarantine the file.
+                    logger.error(f"❌ Killing extraction of {file_path.name} after {self._hard_timeout():.0f}s")
+                    _kill_pool(executor)
+                    yield self._failed_outcome(f"exceeded {self.time_limit:.0f}s time limit (killed)",
+                                               self._hard_timeout())
+                    affected = list(in_flight)
+                except BrokenProcessPool:
+                    # A worker died inside a native parser and took every in-flight
+                    # future with it.
+                    affected = [(file_path, future)] + list(in_flight)
+                except Exception as e:
+                    logger.error(f"Error processing {file_path.name}: {str(e)}")
+                    yield self._failed_outcome()
+                    continue
+
+                # Re-run the files that were in flight on the broken pool one at a
+                # time, so only the culprit is reported as failed.
+                executor.shutdown(wait=True, cancel_futures=True)
+                in_flight.clear()
+                for affected_path, affected_future in affected:
+                    if (affected_future.done() and not affected_future.cancelled()
+                            and affected_future.exception() is None):
+                        yield affected_future.result()
+                    else:
+                        yield self._extract_isolated(affected_path)
+                executor = _extraction_pool(workers)
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def _extract_isolated(self, file_path: Path) -> Dict:
+        """Extract a single file in its own process, surviving a crash or hang of that process"""
+        executor = _extraction_pool(1)
+        try:
+            return executor.submit(self._timed_extract, file_path).result(timeout=self._hard_timeout())
+        except FutureTimeoutError:
+            logger.error(f"❌ Killing extraction of {file_path.name} after {self._hard_timeout():.0f}s")
+            _kill_pool(executor)
+            return self._failed_outcome(f"exceeded {self.time_limit:.0f}s time limit (killed)", self._hard_timeout())
+        except BrokenProcessPool:
+            logger.error(f"❌ Extraction process crashed on {file_path.name}; skipping file")
+            return self._failed_outcome("crashed the extraction process")
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
     
     def _extract_from_file(self, file_path: Path) -> Tuple[str, str, List[Dict]] or None:
         """Extract text from a single file based on its extension"""
@@ -131,21 +558,7 @@ class DocumentLoader:
         """Extract text from PDF files using PyMuPDF"""
         try:
             doc = fitz.open(file_path)
-            full_text = ""
-            page_metadata = []
-            
-            for page_num, page in enumerate(doc, 1):
-                page_text = page.get_text()
-                if page_text.strip():  # Only add non-empty pages
-                    full_text += page_text + "\n"
-                    
-                    page_metadata.append({
-                        "page_number": page_num,
-                        "text": page_text,
-                        "char_start": len(full_text) - len(page_text) - 1,
-                        "char_end": len(full_text) - 1
-                    })
-            
+            full_text, page_metadata = assemble_units(_iter_fitz_units(doc, "page_number"))
             doc.close()
             
             if full_text.strip():
@@ -156,31 +569,19 @@ class DocumentLoader:
                 return None
                 
         except Exception as e:
-            logger.error(f"❌ Error processing PDF {file_path.name}: {str(e)}")
-            return None
+            raise ExtractionFailed(f"Error processing PDF {file_path.name}: {e}") from e
     
     def extract_docx(self, file_path: Path) -> Tuple[str, str, List[Dict]] or None:
         """Extract text from DOCX files"""
         if not DOCX_AVAILABLE:
-            logger.error("python-docx not available. Cannot process .docx files.")
-            return None
+            raise ExtractionFailed("python-docx not available. Cannot process .docx files.")
         
         try:
             doc = DocxDocument(file_path)
-            full_text = ""
-            page_metadata = []
-            
-            for i, paragraph in enumerate(doc.paragraphs):
-                para_text = paragraph.text
-                if para_text.strip():
-                    full_text += para_text + "\n"
-                    
-                    page_metadata.append({
-                        "paragraph_number": i + 1,
-                        "text": para_text,
-                        "char_start": len(full_text) - len(para_text) - 1,
-                        "char_end": len(full_text) - 1
-                    })
+            paragraphs = ((i + 1, paragraph.text) for i, paragraph in enumerate(doc.paragraphs))
+            full_text, page_metadata = assemble_units(
+                ("paragraph_number", number, para_text) for number, para_text in paragraphs if para_text.strip()
+            )
             
             if full_text.strip():
                 logger.info(f"✅ Processed DOCX: {file_path.name} ({len(full_text)} characters, {len(page_metadata)} paragraphs)")
@@ -190,29 +591,14 @@ class DocumentLoader:
                 return None
                 
         except Exception as e:
-            logger.error(f"❌ Error processing DOCX {file_path.name}: {str(e)}")
-            return None
+            raise ExtractionFailed(f"Error processing DOCX {file_path.name}: {e}") from e
     
     def extract_doc(self, file_path: Path) -> Tuple[str, str, List[Dict]] or None:
         """Extract text from DOC files using PyMuPDF (which can handle DOC files)"""
         try:
             # PyMuPDF can handle some DOC files
             doc = fitz.open(file_path)
-            full_text = ""
-            page_metadata = []
-            
-            for page_num, page in enumerate(doc, 1):
-                page_text = page.get_text()
-                if page_text.strip():
-                    full_text += page_text + "\n"
-                    
-                    page_metadata.append({
-                        "page_number": page_num,
-                        "text": page_text,
-                        "char_start": len(full_text) - len(page_text) - 1,
-                        "char_end": len(full_text) - 1
-                    })
-            
+            full_text, page_metadata = assemble_units(_iter_fitz_units(doc, "page_number"))
             doc.close()
             
             if full_text.strip():
@@ -223,128 +609,100 @@ class DocumentLoader:
                 return None
                 
         except Exception as e:
-            logger.error(f"❌ Error processing DOC {file_path.name}: {str(e)}")
-            logger.info("Note: For better DOC support, consider converting to DOCX format")
-            return None
+            raise ExtractionFailed(f"Error processing DOC {file_path.name}: {e} "
+                                   f"(for better DOC support, consider converting to DOCX format)") from e
     
     def extract_xlsx(self, file_path: Path) -> Tuple[str, str, List[Dict]] or None:
-        """Extract text from XLSX files"""
+        """Extract text from XLSX files, streaming rows in read-only mode"""
         if not OPENPYXL_AVAILABLE:
-            logger.error("openpyxl not available. Cannot process .xlsx files.")
-            return None
+            raise ExtractionFailed("openpyxl not available. Cannot process .xlsx files.")
         
         try:
-            workbook = load_workbook(file_path, data_only=True)
-            full_text = ""
-            page_metadata = []
+            start = time.perf_counter()
+            # read_only streams rows from the XML instead of materializing every cell
+            workbook = load_workbook(file_path, read_only=True, data_only=True)
             
-            for sheet_name in workbook.sheetnames:
-                sheet = workbook[sheet_name]
-                sheet_text = f"=== Sheet: {sheet_name} ===\n"
-                
-                for row in sheet.iter_rows(values_only=True):
-                    row_text = "\t".join([str(cell) if cell is not None else "" for cell in row])
-                    if row_text.strip():
-                        sheet_text += row_text + "\n"
-                
-                if sheet_text.strip():
-                    full_text += sheet_text + "\n"
-                    
-                    page_metadata.append({
-                        "sheet_name": sheet_name,
-                        "text": sheet_text,
-                        "char_start": len(full_text) - len(sheet_text) - 1,
-                        "char_end": len(full_text) - 1
-                    })
+            def iter_units():
+                for sheet_name in workbook.sheetnames:
+                    rows = (
+                        (row_number, "\t".join([str(cell) if cell is not None else "" for cell in row]))
+                        for row_number, row in enumerate(workbook[sheet_name].iter_rows(values_only=True), 1)
+                    )
+                    yield from _iter_sheet_units(sheet_name, rows, self.SPREADSHEET_ROWS_PER_UNIT)
             
-            workbook.close()
+            try:
+                full_text, page_metadata = assemble_units(iter_units())
+            finally:
+                workbook.close()
             
             if full_text.strip():
-                logger.info(f"✅ Processed XLSX: {file_path.name} ({len(full_text)} characters, {len(page_metadata)} sheets)")
+                logger.info(f"✅ Processed XLSX: {file_path.name} ({len(full_text)} characters, "
+                            f"{_rows_summary(page_metadata, time.perf_counter() - start)})")
                 return (file_path.stem, full_text, page_metadata)
             else:
                 logger.warning(f"⚠️ No extractable text found in XLSX: {file_path.name}")
                 return None
                 
         except Exception as e:
-            logger.error(f"❌ Error processing XLSX {file_path.name}: {str(e)}")
-            return None
+            raise ExtractionFailed(f"Error processing XLSX {file_path.name}: {e}") from e
     
     def extract_xls(self, file_path: Path) -> Tuple[str, str, List[Dict]] or None:
-        """Extract text from XLS files"""
+        """Extract text from XLS files, loading one sheet at a time"""
         if not XLRD_AVAILABLE:
-            logger.error("xlrd not available. Cannot process .xls files.")
-            return None
+            raise ExtractionFailed("xlrd not available. Cannot process .xls files.")
         
         try:
             import xlrd
-            workbook = xlrd.open_workbook(file_path)
-            full_text = ""
-            page_metadata = []
+            start = time.perf_counter()
+            # on_demand defers parsing each sheet until it is requested, so sheets
+            # can be released again once their rows have been emitted
+            workbook = xlrd.open_workbook(file_path, on_demand=True)
             
-            for sheet_idx in range(workbook.nsheets):
-                sheet = workbook.sheet_by_index(sheet_idx)
-                sheet_name = sheet.name
-                sheet_text = f"=== Sheet: {sheet_name} ===\n"
-                
-                for row_idx in range(sheet.nrows):
-                    row_data = []
-                    for col_idx in range(sheet.ncols):
-                        cell = sheet.cell(row_idx, col_idx)
-                        row_data.append(str(cell.value) if cell.value else "")
-                    
-                    row_text = "\t".join(row_data)
-                    if row_text.strip():
-                        sheet_text += row_text + "\n"
-                
-                if sheet_text.strip():
-                    full_text += sheet_text + "\n"
-                    
-                    page_metadata.append({
-                        "sheet_name": sheet_name,
-                        "text": sheet_text,
-                        "char_start": len(full_text) - len(sheet_text) - 1,
-                        "char_end": len(full_text) - 1
-                    })
+            def iter_units():
+                for sheet_idx in range(workbook.nsheets):
+                    sheet = workbook.sheet_by_index(sheet_idx)
+                    rows = (
+                        (row_idx + 1, "\t".join([str(value) if value else "" for value in sheet.row_values(row_idx)]))
+                        for row_idx in range(sheet.nrows)
+                    )
+                    yield from _iter_sheet_units(sheet.name, rows, self.SPREADSHEET_ROWS_PER_UNIT)
+                    workbook.unload_sheet(sheet_idx)
+            
+            try:
+                full_text, page_metadata = assemble_units(iter_units())
+            finally:
+                workbook.release_resources()
             
             if full_text.strip():
-                logger.info(f"✅ Processed XLS: {file_path.name} ({len(full_text)} characters, {len(page_metadata)} sheets)")
+                logger.info(f"✅ Processed XLS: {file_path.name} ({len(full_text)} characters, "
+                            f"{_rows_summary(page_metadata, time.perf_counter() - start)})")
                 return (file_path.stem, full_text, page_metadata)
             else:
                 logger.warning(f"⚠️ No extractable text found in XLS: {file_path.name}")
                 return None
                 
         except Exception as e:
-            logger.error(f"❌ Error processing XLS {file_path.name}: {str(e)}")
-            return None
+            raise ExtractionFailed(f"Error processing XLS {file_path.name}: {e}") from e
     
     def extract_pptx(self, file_path: Path) -> Tuple[str, str, List[Dict]] or None:
         """Extract text from PPTX files"""
         if not PPTX_AVAILABLE:
-            logger.error("python-pptx not available. Cannot process .pptx files.")
-            return None
+            raise ExtractionFailed("python-pptx not available. Cannot process .pptx files.")
         
         try:
             presentation = Presentation(file_path)
-            full_text = ""
-            page_metadata = []
+            units = []
             
             for slide_num, slide in enumerate(presentation.slides, 1):
-                slide_text = f"=== Slide {slide_num} ===\n"
+                lines = [f"=== Slide {slide_num} ===\n"]
                 
                 for shape in slide.shapes:
                     if hasattr(shape, "text") and shape.text.strip():
-                        slide_text += shape.text + "\n"
+                        lines.append(shape.text + "\n")
                 
-                if slide_text.strip():
-                    full_text += slide_text + "\n"
-                    
-                    page_metadata.append({
-                        "slide_number": slide_num,
-                        "text": slide_text,
-                        "char_start": len(full_text) - len(slide_text) - 1,
-                        "char_end": len(full_text) - 1
-                    })
+                units.append(("slide_number", slide_num, "".join(lines)))
+            
+            full_text, page_metadata = assemble_units(units)
             
             if full_text.strip():
                 logger.info(f"✅ Processed PPTX: {file_path.name} ({len(full_text)} characters, {len(page_metadata)} slides)")
@@ -354,30 +712,17 @@ class DocumentLoader:
                 return None
                 
         except Exception as e:
-            logger.error(f"❌ Error processing PPTX {file_path.name}: {str(e)}")
-            return None
+            raise ExtractionFailed(f"Error processing PPTX {file_path.name}: {e}") from e
     
     def extract_ppt(self, file_path: Path) -> Tuple[str, str, List[Dict]] or None:
         """Extract text from PPT files using PyMuPDF"""
         try:
             # PyMuPDF can handle some PPT files
             doc = fitz.open(file_path)
-            full_text = ""
-            page_metadata = []
-            
-            for page_num, page in enumerate(doc, 1):
-                page_text = page.get_text()
-                if page_text.strip():
-                    slide_text = f"=== Slide {page_num} ===\n" + page_text + "\n"
-                    full_text += slide_text
-                    
-                    page_metadata.append({
-                        "slide_number": page_num,
-                        "text": page_text,
-                        "char_start": len(full_text) - len(slide_text),
-                        "char_end": len(full_text)
-                    })
-            
+            full_text, page_metadata = assemble_units(
+                (unit_key, page_num, f"=== Slide {page_num} ===\n" + page_text)
+                for unit_key, page_num, page_text in _iter_fitz_units(doc, "slide_number")
+            )
             doc.close()
             
             if full_text.strip():
@@ -388,19 +733,18 @@ class DocumentLoader:
                 return None
                 
         except Exception as e:
-            logger.error(f"❌ Error processing PPT {file_path.name}: {str(e)}")
-            logger.info("Note: For better PPT support, consider converting to PPTX format")
-            return None
+            raise ExtractionFailed(f"Error processing PPT {file_path.name}: {e} "
+                                   f"(for better PPT support, consider converting to PPTX format)") from e
 
 
 # Backward compatibility function
-def extract_text_from_pdfs(pdf_dir: str) -> List[Tuple[str, str, List[Dict]]]:
+def extract_text_from_pdfs(pdf_dir: str, workers: int = 1) -> List[Tuple[str, str, List[Dict]]]:
     """
     Backward compatibility function for existing code.
     Now extracts from all supported document formats, not just PDFs.
     """
     loader = DocumentLoader()
-    return loader.extract_text_from_documents(pdf_dir)
+    return loader.extract_text_from_documents(pdf_dir, workers=workers)
 
 
 # Main function for testing
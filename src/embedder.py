@@ -1,41 +1,442 @@
-import warnings
-from sentence_transformers import SentenceTransformer
 import faiss
-import pickle
+import multiprocessing
+import numpy as np
 import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+
+from embedding_cache import EMBED_CACHE_DIR, EmbeddingCache
+from index_factory import (IDS_FILE, VECTORS_FILE, RescoredIndex, add_with_ids, base_index, create_index, index_type,
+                           needs_training, stored_ids, train_index, training_rows, with_rescoring, with_stable_ids,
+                           write_index)
+from manifest import save_index_info
+from metadata_store import METADATA_DB, MetadataUpdater, MetadataWriter
+from model_manager import get_model, model_manager
+
+# Texts per forward pass of the model
+ENCODE_BATCH_SIZE = 32
+
+# Vectors added to a freshly trained index per add call
+TRAIN_ADD_BATCH = 65536
 
-# Suppress the specific FutureWarning about encoder_attention_mask
-warnings.filterwarnings("ignore", message=".*encoder_attention_mask.*", category=FutureWarning)
 
-# Initialize model with offline capability
 def get_embedder_model():
-    """Get or initialize the sentence transformer model with offline support"""
-    try:
-        # Try to load model with local_files_only=True for offline usage
-        model = SentenceTransformer("all-MiniLM-L6-v2", local_files_only=True)
-        return model
-    except Exception as e:
-        print(f"⚠️ Warning: Could not load model in offline mode: {e}")
-        try:
-            # Try to load normally (may require internet for first download)
-            print("📡 Attempting to download model (internet required)...")
-            model = SentenceTransformer("all-MiniLM-L6-v2")
-            return model
-        except Exception as e2:
-            print(f"❌ Error: Could not load model: {e2}")
-            print("💡 Solution: Connect to internet for first-time model download, then it will work offline.")
-            raise
-
-# Initialize model once
-model = get_embedder_model()
-
-def build_faiss_index(chunks: list[str], metadatas: list[dict], save_path: str):
-    embeddings = model.encode(chunks, show_progress_bar=True)
-    dim = len(embeddings[0])
-    index = faiss.IndexFlatL2(dim)
-    index.add(embeddings)
-
-    faiss.write_index(index, f"{save_path}/index.faiss")
-
-    with open(f"{save_path}/metadata.pkl", "wb") as f:
-        pickle.dump(metadatas, f)
+    """Get the shared sentence transformer model (loaded on first use)"""
+    return get_model()
+
+def __getattr__(name):
+    # `embedder.model` used to be loaded at import time; it now resolves to the
+    # shared, lazily loaded model so importing this module stays cheap.
+    if name == "model":
+        return get_model()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def embed_chunks(chunks: list[str], show_progress_bar: bool = True, cache: EmbeddingCache = None):
+    """Encode chunk texts into float32 vectors, reusing cached vectors when a cache is given"""
+    def encode(texts):
+        return np.asarray(get_model().encode(texts, show_progress_bar=show_progress_bar), dtype="float32")
+    if cache is not None:
+        return cache.embed(chunks, encode)
+    return encode(chunks)
+
+def open_embedding_cache(cache_dir: str = EMBED_CACHE_DIR) -> EmbeddingCache:
+    """Open the embedding cache for the current model and its sequence limit"""
+    model = get_model()
+    # Backends agree only within a tolerance, so each keeps its own vectors
+    suffix = "" if model_manager.backend == "torch" else f"-{model_manager.backend}"
+    return EmbeddingCache(cache_dir, f"{model_manager.model_name}-seq{model.max_seq_length}{suffix}")
+
+def get_tokenizer():
+    """Return the model's tokenizer and how many text tokens it encodes before truncating"""
+    model = get_model()
+    tokenizer = model.tokenizer
+    return tokenizer, model.max_seq_length - tokenizer.num_special_tokens_to_add(pair=False)
+
+def count_truncated(texts: list[str]) -> int:
+    """Count texts longer than the model's sequence limit; encode() silently drops the excess"""
+    model = get_model()
+    encoded = model.tokenizer(texts, add_special_tokens=True, return_attention_mask=False,
+                              return_token_type_ids=False, verbose=False)
+    return sum(1 for ids in encoded["input_ids"] if len(ids) > model.max_seq_length)
+
+def index_metric(index) -> str:
+    """The metric an index was built for: inner-product indexes hold normalized vectors"""
+    return "cosine" if index.metric_type == faiss.METRIC_INNER_PRODUCT else "l2"
+
+def prepare_vectors(vectors: np.ndarray, metric: str) -> np.ndarray:
+    """Return vectors as stored for the metric, leaving the input untouched"""
+    if metric != "cosine":
+        return np.ascontiguousarray(vectors, dtype="float32")
+    vectors = np.array(vectors, dtype="float32", order="C")
+    faiss.normalize_L2(vectors)
+    return vectors
+
+def describe_index(index, params: dict = None, next_id: int = None) -> dict:
+    """The index_info.json record of an index, read back by the query path"""
+    return {
+        "metric": index_metric(index),
+        "index": params or {"type": index_type(index)},
+        "dimension": index.d,
+        "vectors": index.ntotal,
+        # Chunk ids are never reused, so ids held by readers stay unambiguous
+        "next_id": index.ntotal if next_id is None else next_id,
+        "model": model_manager.model_name,
+        "backend": model_manager.backend,
+    }
+
+def build_faiss_index(chunks: list[str], metadatas: list[dict], save_path: str, cache: EmbeddingCache = None,
+                      metric: str = "l2", params: dict = None):
+    embeddings = prepare_vectors(embed_chunks(chunks, cache=cache), metric)
+    if cache is not None:
+        cache.flush()
+    if params and needs_training(params):
+        index, params = train_index(embeddings.shape[1], metric, params, embeddings)
+    else:
+        index = create_index(embeddings.shape[1], metric, params)
+    index = with_rescoring(with_stable_ids(index), params)
+    index.add_with_ids(embeddings, np.arange(len(embeddings), dtype="int64"))
+
+    save_faiss_index(index, metadatas, save_path, params)
+
+def save_vectors_file(index, save_path: str, block_rows: int = 65536):
+    """
+    Write the float32 vectors of a flat index, or the raw vectors kept for
+    re-scoring, to vectors.npy for memory-mapped serving, with their chunk ids
+    in vector_ids.npy. Rows are in ascending id order.
+
+    Copied out in blocks so the build never holds a second full copy. Other
+    indexes keep no such files: stale ones are removed.
+    """
+    path = f"{save_path}/{VECTORS_FILE}"
+    ids_path = f"{save_path}/{IDS_FILE}"
+    if isinstance(index, RescoredIndex):
+        index = index.raw
+    elif not isinstance(base_index(index), faiss.IndexFlat):
+        for stale in (path, ids_path):
+            if os.path.exists(stale):
+                os.remove(stale)
+        return
+    ids = stored_ids(index)
+    order = np.argsort(ids, kind="stable")
+    storage = base_index(index)
+    tmp_path = f"{path}.tmp.npy"
+    if index.ntotal == 0:
+        np.save(tmp_path, np.empty((0, index.d), dtype="float32"))
+    else:
+        stored = faiss.rev_swig_ptr(storage.get_xb(), storage.ntotal * storage.d).reshape(storage.ntotal, storage.d)
+        out = np.lib.format.open_memmap(tmp_path, mode="w+", dtype="float32", shape=(index.ntotal, index.d))
+        for start in range(0, index.ntotal, block_rows):
+            out[start:start + block_rows] = stored[order[start:start + block_rows]]
+        out.flush()
+        del out
+    np.save(f"{ids_path}.tmp.npy", ids[order])
+    os.replace(f"{ids_path}.tmp.npy", ids_path)
+    os.replace(tmp_path, path)
+
+def save_faiss_index(index, metadatas: list[dict], save_path: str, params: dict = None):
+    write_index(index, f"{save_path}/index.faiss")
+    save_vectors_file(index, save_path)
+
+    metadata_writer = MetadataWriter(f"{save_path}/{METADATA_DB}")
+    metadata_writer.add(metadatas, range(len(metadatas)))
+    metadata_writer.commit()
+    save_index_info(save_path, describe_index(index, params))
+
+
+def encode_texts(model, texts: list[str], batch_size: int = ENCODE_BATCH_SIZE):
+    """
+    Encode texts in one call, timed, with an estimate of the padding it costs.
+
+    The model already sorts its inputs by length before batching, so each
+    forward pass is padded only to its longest text. The padding estimate
+    replays that order on character lengths instead of tokenizing every text
+    a second time.
+
+    Returns: (float32 vectors in input order, padded characters, real characters, seconds)
+    """
+    started = time.perf_counter()
+    vectors = np.asarray(model.encode(texts, batch_size=batch_size, show_progress_bar=False), dtype="float32")
+    lengths = sorted((len(text) for text in texts), reverse=True)
+    padded = sum(lengths[start] * len(lengths[start:start + batch_size])
+                 for start in range(0, len(lengths), batch_size))
+    return vectors, padded, sum(lengths), time.perf_counter() - started
+
+def _init_encoder_worker(backend: str, threads: int):
+    model_manager.configure(backend=backend, threads=threads)
+    if backend == "torch" and threads:
+        import torch
+        torch.set_num_threads(threads)
+    get_model()
+
+def _encode_in_worker(texts: list[str], batch_size: int):
+    return encode_texts(get_model(), texts, batch_size)
+
+
+class ChunkEncoder:
+    """
+    Chunk encoding, in this process or a pool of CPU workers.
+
+    With workers > 1 each worker process loads its own copy of the model, on
+    the parent's backend, and uses `threads` torch or ONNX Runtime threads
+    (default: the CPU cores split evenly), and submitted batches are encoded
+    concurrently. Throughput and padding overhead are tracked for the
+    end-of-build report.
+    """
+
+    def __init__(self, batch_size: int = ENCODE_BATCH_SIZE, workers: int = 1, threads: int = None):
+        if workers is not None and workers <= 0:
+            workers = os.cpu_count() or 1
+        self.batch_size = batch_size
+        self.workers = workers or 1
+        self.threads = threads or (max(1, (os.cpu_count() or 1) // self.workers) if self.workers > 1 else None)
+        self.encoded = 0
+        self.padded_chars = 0
+        self.real_chars = 0
+        self.encode_seconds = 0.0
+        self._lock = threading.Lock()
+        self._executor = None
+        self._started = None
+        self._finished = None
+
+    @property
+    def window(self) -> int:
+        """Batches to keep in flight so every worker stays busy"""
+        return self.workers * 2 if self.workers > 1 else 0
+
+    def submit(self, texts: list[str]) -> Future:
+        """Encode texts, returning a future of their float32 vectors"""
+        if self._started is None:
+            self._started = time.perf_counter()
+        if self.workers <= 1:
+            future = Future()
+            future.set_result(self._record(encode_texts(get_model(), texts, self.batch_size)))
+            return future
+        if self._executor is None:
+            # Spawned, not forked: the parent may already run torch threads
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_encoder_worker, initargs=(model_manager.backend, self.threads))
+        outer = Future()
+        inner = self._executor.submit(_encode_in_worker, texts, self.batch_size)
+
+        def done(f):
+            try:
+                outer.set_result(self._record(f.result()))
+            except BaseException as e:
+                outer.set_exception(e)
+        inner.add_done_callback(done)
+        return outer
+
+    def _record(self, result) -> np.ndarray:
+        vectors, padded_chars, real_chars, seconds = result
+        # Called from the pool's result thread as well as this one
+        with self._lock:
+            self.encoded += len(vectors)
+            self.padded_chars += padded_chars
+            self.real_chars += real_chars
+            self.encode_seconds += seconds
+            self._finished = time.perf_counter()
+        return vectors
+
+    def report(self):
+        if not self.encoded:
+            return
+        seconds = max(self._finished - self._started, 1e-9)
+        padding = (self.padded_chars / self.real_chars - 1) * 100 if self.real_chars else 0.0
+        # Excludes worker start-up and time spent waiting for chunks to arrive
+        busy_rate = self.encoded * self.workers / max(self.encode_seconds, 1e-9)
+        print(f"⚡ Encoded {self.encoded} chunk(s) in {seconds:.1f}s: {self.encoded / seconds:.1f} sentences/s overall, "
+              f"{busy_rate:.1f} sentences/s while encoding ({self.workers} worker(s), "
+              f"batch size {self.batch_size}, ~{padding:.1f}% padding overhead)")
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+
+class StreamingIndexWriter:
+    """
+    Incrementally build a FAISS index from batches of chunk metadata.
+
+    Each batch is embedded and added to the index as soon as it arrives under
+    fresh chunk ids (counting up from next_id), and its metadata is inserted
+    into metadata.db under the same ids, so the chunk texts never accumulate
+    in memory. Output goes to temporary files that only
+    replace the live index on close(), leaving it intact if the build fails.
+
+    Given an existing index, the writer appends to it instead: metadata goes
+    through a MetadataUpdater of the live metadata.db, whose rows of
+    removed_ids (already taken out of the index) are deleted on close().
+
+    Index types that need training (IVF, sq8) spill the vectors to a
+    temporary file while keeping a uniform reservoir sample of the whole
+    stream, then train on that sample in close() and add the spilled vectors.
+    """
+
+    def __init__(self, save_path: str, index=None, metadata: MetadataUpdater = None, removed_ids: list[int] = (),
+                 cache: EmbeddingCache = None, encoder: ChunkEncoder = None, metric: str = "l2", params: dict = None,
+                 next_id: int = 0):
+        self.save_path = save_path
+        self.index = index
+        # Appending to an existing index keeps the metric and type it was built with
+        self.metric = index_metric(index) if index is not None else metric
+        self.params = params or {"type": index_type(index) if index is not None else "flat"}
+        # Reservoir sample of the stream and the spill of not yet indexed vectors
+        self._sample = None
+        self._sample_rows = 0
+        self._seen = 0
+        self._rng = np.random.default_rng(0)
+        self._spill_path = f"{save_path}/training.tmp"
+        self._spill = None
+        self._spill_ids = []
+        self.cache = cache
+        self.encoder = encoder or ChunkEncoder()
+        self.added = 0
+        self._in_flight = deque()
+        self._index_tmp = f"{save_path}/index.faiss.tmp"
+        self._metadata = metadata or MetadataWriter(f"{save_path}/{METADATA_DB}")
+        self._removed_ids = removed_ids
+        self.next_id = next_id
+
+    def add(self, metadatas: list[dict]):
+        """
+        Embed one batch of chunk records and append it to the index.
+
+        With a multi-process encoder, several batches are encoded at once and
+        appended in submission order as they complete.
+        """
+        if not metadatas:
+            return
+        texts = [meta["text"] for meta in metadatas]
+        if self.cache is not None:
+            keys, vectors, missing = self.cache.lookup(texts)
+        else:
+            keys, vectors, missing = None, None, list(range(len(texts)))
+        future = self.encoder.submit([texts[i] for i in missing]) if missing else None
+        self._in_flight.append((metadatas, keys, vectors, missing, future))
+        while len(self._in_flight) > self.encoder.window:
+            self._append_oldest()
+
+    def _append_oldest(self):
+        metadatas, keys, vectors, missing, future = self._in_flight.popleft()
+        if future is not None:
+            encoded = future.result()
+            if vectors is None:
+                vectors = encoded
+            else:
+                vectors[missing] = encoded
+            if self.cache is not None:
+                self.cache.add([keys[i] for i in missing], encoded)
+        # Cached vectors stay raw; only the index copy is normalized
+        ids = np.arange(self.next_id, self.next_id + len(metadatas), dtype="int64")
+        self.next_id += len(metadatas)
+        self._add_vectors(prepare_vectors(vectors, self.metric), ids)
+        if isinstance(self._metadata, MetadataUpdater):
+            self._metadata.insert(metadatas, ids)
+        else:
+            self._metadata.add(metadatas, ids)
+        self.added += len(metadatas)
+        print(f"   🔗 Embedded {self.added} chunk(s)...")
+
+    def _add_vectors(self, vectors: np.ndarray, ids: np.ndarray):
+        if self.index is None and not needs_training(self.params):
+            self.index = with_rescoring(with_stable_ids(create_index(vectors.shape[1], self.metric, self.params)),
+                                        self.params)
+        if self.index is not None:
+            add_with_ids(self.index, vectors, ids)
+            return
+        vectors = np.ascontiguousarray(vectors, dtype="float32")
+        if self._spill is None:
+            self._spill = open(self._spill_path, "wb")
+            self._sample = np.empty((training_rows(self.params), vectors.shape[1]), dtype="float32")
+        self._spill.write(vectors.tobytes())
+        self._spill_ids.append(ids)
+        self._reservoir(vectors)
+
+    def _reservoir(self, vectors: np.ndarray):
+        """Keep every streamed vector in the training sample with equal probability"""
+        size = len(self._sample)
+        fill = min(size - self._sample_rows, len(vectors))
+        self._sample[self._sample_rows:self._sample_rows + fill] = vectors[:fill]
+        self._sample_rows += fill
+        if fill < len(vectors):
+            # Algorithm R: the t-th vector replaces a random slot with probability size / (t + 1)
+            positions = np.arange(self._seen + fill, self._seen + len(vectors))
+            slots = self._rng.integers(0, positions + 1)
+            for row in np.nonzero(slots < size)[0]:
+                self._sample[slots[row]] = vectors[fill + row]
+        self._seen += len(vectors)
+
+    def _train(self):
+        self._spill.close()
+        self._spill = None
+        ids = np.concatenate(self._spill_ids)
+        self._spill_ids = []
+        sample = self._sample[:self._sample_rows]
+        self._sample = None
+        index, self.params = train_index(sample.shape[1], self.metric, self.params, sample)
+        self.index = with_rescoring(with_stable_ids(index), self.params)
+        spilled = np.memmap(self._spill_path, dtype="float32", mode="r", shape=(len(ids), sample.shape[1]))
+        for start in range(0, len(ids), TRAIN_ADD_BATCH):
+            end = start + TRAIN_ADD_BATCH
+            self.index.add_with_ids(np.array(spilled[start:end]), ids[start:end])
+        del spilled
+        os.remove(self._spill_path)
+
+    def close(self, duplicate_refs: dict = None):
+        """
+        Write the index and atomically swap the new files into place.
+
+        duplicate_refs maps chunk ids to the sources of chunks that were
+        collapsed into them; they are added to those rows' duplicates.
+
+        When appending, new rows are committed before the index that returns
+        their ids replaces the live one, and rows of removed chunks are
+        deleted after it, so readers never get an id without metadata.
+        """
+        while self._in_flight:
+            self._append_oldest()
+        if self._spill is not None:
+            self._train()
+        self.encoder.close()
+        self.encoder.report()
+        self._flush_cache()
+        if duplicate_refs:
+            self._metadata.add_duplicates(duplicate_refs)
+        save_vectors_file(self.index, self.save_path)
+        write_index(self.index, self._index_tmp)
+        if isinstance(self._metadata, MetadataUpdater):
+            self._metadata.commit()
+            os.replace(self._index_tmp, f"{self.save_path}/index.faiss")
+            self._metadata.delete(self._removed_ids)
+            self._metadata.commit()
+            self._metadata.close()
+        else:
+            os.replace(self._index_tmp, f"{self.save_path}/index.faiss")
+            self._metadata.commit()
+        save_index_info(self.save_path, describe_index(self.index, self.params, self.next_id))
+
+    def _flush_cache(self):
+        if self.cache is None:
+            return
+        # Vectors computed before a failure are still valid: keep them either way
+        self.cache.flush()
+        if self.cache.hits:
+            print(f"♻️ Reused {self.cache.hits} cached embedding(s), encoded {self.cache.misses} new chunk(s)")
+
+    def abort(self):
+        """Discard the partially written output"""
+        self._in_flight.clear()
+        if self._spill is not None:
+            self._spill.close()
+            self._spill = None
+        self._sample, self._spill_ids = None, []
+        self.encoder.close()
+        self._flush_cache()
+        self._metadata.abort()
+        for path in (self._index_tmp, self._spill_path):
+            if os.path.exists(path):
+                os.remove(path)
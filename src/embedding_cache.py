@@ -0,0 +1,217 @@
+import hashlib
+import os
+import re
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+
+EMBED_CACHE_DIR = "cache/embeddings"
+
+# Vectors buffered before they are written out as a new shard
+SHARD_ROWS = 8192
+# Past this many shards, flush() merges them into one
+MAX_SHARDS = 32
+
+KEY_BYTES = 16
+
+
+def text_key(text: str) -> bytes:
+    """Cache key of a chunk text"""
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=KEY_BYTES).digest()
+
+
+class EmbeddingCache:
+    """
+    Persistent chunk embeddings keyed by (model, chunk text hash).
+
+    Each model gets its own directory of append-only shards: shard-*.npy holds
+    float32 vectors and shard-*.keys.npy the text hashes of the same rows. The
+    key index is read into memory on open; vectors are memory-mapped and only
+    the rows that are hit get read. New vectors are buffered and written as a
+    fresh shard, via a temporary file and rename, so an interrupted build
+    never leaves a shard that readers would pick up half written.
+    """
+
+    PENDING = -1
+
+    def __init__(self, cache_dir: str, namespace: str):
+        safe_namespace = re.sub(r"[^A-Za-z0-9._-]+", "_", namespace)
+        self.cache_dir = Path(cache_dir) / safe_namespace
+        self.hits = 0
+        self.misses = 0
+        self._index: Dict[bytes, Tuple[int, int]] = {}
+        self._shards: List[np.ndarray] = []
+        self._shard_paths: List[Path] = []
+        self._pending_keys: List[bytes] = []
+        self._pending_vectors: List[np.ndarray] = []
+        self._load_index()
+
+    def _load_index(self):
+        if not self.cache_dir.exists():
+            return
+        for keys_path in sorted(self.cache_dir.glob("shard-*.keys.npy")):
+            vectors_path = keys_path.with_name(keys_path.name.replace(".keys.npy", ".npy"))
+            try:
+                keys = np.load(keys_path)
+                vectors = np.load(vectors_path, mmap_mode="r")
+            except (OSError, ValueError) as e:
+                print(f"⚠️ Ignoring unreadable embedding cache shard {vectors_path.name}: {e}")
+                continue
+            if len(keys) != len(vectors):
+                print(f"⚠️ Ignoring inconsistent embedding cache shard {vectors_path.name}")
+                continue
+            shard_id = len(self._shards)
+            self._shards.append(vectors)
+            self._shard_paths.append(vectors_path)
+            raw = keys.tobytes()
+            for row in range(len(keys)):
+                self._index[raw[row * KEY_BYTES:(row + 1) * KEY_BYTES]] = (shard_id, row)
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def lookup(self, texts: List[str]) -> Tuple[List[bytes], np.ndarray, List[int]]:
+        """
+        Look texts up without encoding anything.
+
+        Returns (keys, vectors, missing): vectors has a row per text, with the
+        rows listed in missing left unset, or is None if nothing was found.
+        """
+        keys = [text_key(text) for text in texts]
+        found = [self._index.get(key) for key in keys]
+        missing = [i for i, location in enumerate(found) if location is None]
+        self.hits += len(texts) - len(missing)
+        self.misses += len(missing)
+        if len(missing) == len(texts):
+            return keys, None, missing
+
+        first = next(location for location in found if location is not None)
+        vectors = np.empty((len(texts), self._source(first[0]).shape[1]), dtype="float32")
+        # Read hits shard by shard so each memory map is indexed once
+        by_shard: Dict[int, List[Tuple[int, int]]] = {}
+        for i, location in enumerate(found):
+            if location is not None:
+                by_shard.setdefault(location[0], []).append((i, location[1]))
+        for shard_id, rows in by_shard.items():
+            positions, shard_rows = zip(*rows)
+            vectors[list(positions)] = self._source(shard_id)[list(shard_rows)]
+        return keys, vectors, missing
+
+    def add(self, keys: List[bytes], vectors: np.ndarray):
+        """Buffer new vectors; call flush() to persist them"""
+        if not keys:
+            return
+        for key in keys:
+            # Unflushed rows live in the pending buffer, marked by shard -1
+            self._index[key] = (self.PENDING, len(self._pending_keys))
+            self._pending_keys.append(key)
+        self._pending_vectors.append(np.asarray(vectors, dtype="float32"))
+        if len(self._pending_keys) >= SHARD_ROWS:
+            self.flush()
+
+    def embed(self, texts: List[str], encode: Callable[[List[str]], np.ndarray]) -> np.ndarray:
+        """
+        Return float32 vectors for texts, calling encode only for cache misses.
+
+        New vectors are added to the cache; call flush() to persist them.
+        """
+        keys, vectors, missing = self.lookup(texts)
+        if not missing:
+            return vectors
+        encoded = np.asarray(encode([texts[i] for i in missing]), dtype="float32")
+        if vectors is None:
+            vectors = encoded
+        else:
+            vectors[missing] = encoded
+        self.add([keys[i] for i in missing], encoded)
+        return vectors
+
+    def _source(self, shard_id: int) -> np.ndarray:
+        return self._pending_array() if shard_id == self.PENDING else self._shards[shard_id]
+
+    def _pending_array(self) -> np.ndarray:
+        if len(self._pending_vectors) > 1:
+            self._pending_vectors = [np.concatenate(self._pending_vectors)]
+        return self._pending_vectors[0]
+
+    def _new_shard_paths(self) -> Tuple[Path, Path]:
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        name = f"shard-{time.time_ns():020d}-{os.getpid()}"
+        return self.cache_dir / f"{name}.npy", self.cache_dir / f"{name}.keys.npy"
+
+    @staticmethod
+    def _save(path: Path, array: np.ndarray):
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            np.save(f, array)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _key_array(keys: List[bytes]) -> np.ndarray:
+        return np.frombuffer(b"".join(keys), dtype=np.uint8).reshape(len(keys), KEY_BYTES)
+
+    def _write_shard(self, keys: List[bytes], vectors: np.ndarray) -> Path:
+        vectors_path, keys_path = self._new_shard_paths()
+        # Vectors first: a shard only counts once its keys file exists
+        self._save(vectors_path, vectors)
+        self._save(keys_path, self._key_array(keys))
+        return vectors_path
+
+    def flush(self):
+        """Write buffered vectors to a new shard, merging shards if there are too many"""
+        if not self._pending_keys:
+            return
+        vectors = self._pending_array()
+        vectors_path = self._write_shard(self._pending_keys, vectors)
+        shard_id = len(self._shards)
+        self._shards.append(np.load(vectors_path, mmap_mode="r"))
+        self._shard_paths.append(vectors_path)
+        for row, key in enumerate(self._pending_keys):
+            self._index[key] = (shard_id, row)
+        self._pending_keys = []
+        self._pending_vectors = []
+
+        if len(self._shards) > MAX_SHARDS:
+            self._compact()
+
+    def _compact(self):
+        """
+        Merge every shard into one, so the directory does not grow a file per build.
+
+        Rows are streamed shard by shard into a memory-mapped output, so only a
+        slice of one shard is in memory at a time. Rows whose key was written
+        again in a later shard are no longer referenced and are dropped.
+        """
+        by_shard: Dict[int, List[Tuple[int, bytes]]] = {}
+        for key, (shard_id, row) in self._index.items():
+            by_shard.setdefault(shard_id, []).append((row, key))
+        vectors_path, keys_path = self._new_shard_paths()
+        tmp_path = vectors_path.with_name(vectors_path.name + ".tmp")
+        merged = np.lib.format.open_memmap(tmp_path, mode="w+", dtype="float32",
+                                           shape=(len(self._index), self._shards[0].shape[1]))
+        keys = []
+        for shard_id, entries in sorted(by_shard.items()):
+            # In row order, so each slice reads the shard sequentially
+            entries.sort()
+            rows = np.array([row for row, _ in entries], dtype=np.int64)
+            for start in range(0, len(rows), SHARD_ROWS):
+                block = rows[start:start + SHARD_ROWS]
+                merged[len(keys) + start:len(keys) + start + len(block)] = self._shards[shard_id][block]
+            keys.extend(key for _, key in entries)
+        merged.flush()
+        del merged
+        os.replace(tmp_path, vectors_path)
+        self._save(keys_path, self._key_array(keys))
+
+        old_paths = list(self._shard_paths)
+        self._shards = [np.load(vectors_path, mmap_mode="r")]
+        self._shard_paths = [vectors_path]
+        self._index = {key: (0, row) for row, key in enumerate(keys)}
+        for path in old_paths:
+            for stale in (path.with_name(path.name.replace(".npy", ".keys.npy")), path):
+                try:
+                    os.remove(stale)
+                except OSError:
+                    pass
@@ -0,0 +1,48 @@
+import os
+import pickle
+from pathlib import Path
+from typing import Any, Tuple
+
+EXTRACT_CACHE_DIR = "cache/extracted"
+
+# Entry of a file that was extracted but holds no text
+NO_TEXT = "no-text"
+
+
+class ExtractionCache:
+    """
+    On-disk cache of extractor output keyed by file content hash.
+
+    Entries live under <cache_dir>/<extractor_version>/<hash[:2]>/<hash>.pkl and
+    hold (full_text, page_metadata), or NO_TEXT for files that were read but
+    have no extractable text. Failed extractions are never stored.
+    The filename is not part of the entry, so renamed or copied files still hit.
+    Bumping the extractor version starts a fresh namespace.
+    """
+
+    def __init__(self, cache_dir: str = EXTRACT_CACHE_DIR, extractor_version: str = "1"):
+        self.cache_dir = Path(cache_dir) / f"v{extractor_version}"
+
+    def _entry_path(self, content_hash: str) -> Path:
+        return self.cache_dir / content_hash[:2] / f"{content_hash}.pkl"
+
+    def get(self, content_hash: str) -> Tuple[bool, Any]:
+        """Return (hit, value) for a content hash"""
+        entry_path = self._entry_path(content_hash)
+        try:
+            with open(entry_path, "rb") as f:
+                return True, pickle.load(f)
+        except FileNotFoundError:
+            return False, None
+        except (OSError, pickle.UnpicklingError, EOFError):
+            # Corrupt or truncated entry: treat as a miss, it will be rewritten
+            return False, None
+
+    def put(self, content_hash: str, value: Any):
+        """Store an entry; safe to call concurrently from several worker processes"""
+        entry_path = self._entry_path(content_hash)
+        entry_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = entry_path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, "wb") as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, entry_path)
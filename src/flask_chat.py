@@ -7,8 +7,10 @@ from datetime import datetime
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 # Import your existing modules
-from retriever import load_faiss_index, retrieve
+from model_manager import model_manager, preload_model
+from retriever import index_version, load_faiss_index, retrieve
 from generator import generate_detailed_answer
+from discovery import DOCUMENT_EXTENSIONS, discover_documents_cached
 
 app = Flask(__name__)
 
@@ -18,35 +20,43 @@ DOC_DIR = "../data"  # Renamed from PDF_DIR since we now support multiple format
 
 # Global variables to store the loaded index and metadata
 rag_system_loaded = False
+loaded_version = None
 index = None
 metadata = None
 
 def load_rag_system():
-    """Load the RAG system (FAISS index and metadata)"""
-    global rag_system_loaded, index, metadata
+    """Load the RAG system (FAISS index and metadata), again whenever a build or edit replaced it"""
+    global rag_system_loaded, loaded_version, index, metadata
     
-    if not rag_system_loaded:
+    # Construct the correct path to embeddings
+    embedding_path = os.path.join(os.path.dirname(__file__), EMBEDDING_DIR)
+    version = index_version(embedding_path)
+    if not rag_system_loaded or version != loaded_version:
         try:
-            # Construct the correct path to embeddings
-            embedding_path = os.path.join(os.path.dirname(__file__), EMBEDDING_DIR)
-            
             if not os.path.exists(os.path.join(embedding_path, "index.faiss")):
                 return False, "No embeddings found! Please run the build pipeline first."
             
-            index, metadata = load_faiss_index(embedding_path)
-            rag_system_loaded = True
-            return True, "RAG system loaded successfully!"
+            # Memory-mapped, so every worker process shares one copy of the vectors
+            previous = metadata
+            index, metadata = load_faiss_index(embedding_path, mmap=True)
+            # Release the replaced index's SQLite connection; its mapped vectors go with the last reference
+            if hasattr(previous, "close"):
+                previous.close()
+            reloaded = rag_system_loaded
+            rag_system_loaded, loaded_version = True, version
+            return True, "RAG system reloaded after an index update." if reloaded else "RAG system loaded successfully!"
             
         except Exception as e:
             return False, f"Error loading RAG system: {str(e)}"
     
     return True, "RAG system already loaded."
 
-def get_answer(query: str, top_k: int = 5):
+def get_answer(query: str, top_k: int = 5, min_score: float = None, nprobe: int = None, ef_search: int = None):
     """Get answer from the RAG system"""
     try:
-        # Retrieve relevant chunks
-        relevant_chunks = retrieve(query, index, metadata, k=top_k)
+        # Retrieve relevant chunks, dropping any that score below min_score
+        relevant_chunks = retrieve(query, index, metadata, k=top_k, min_score=min_score,
+                                   nprobe=nprobe, ef_search=ef_search)
         
         # Generate detailed answer
         answer = generate_detailed_answer(query, relevant_chunks)
@@ -86,6 +96,23 @@ def home():
     """Render the main chat interface"""
     return render_template('chat.html')
 
+def _number_option(data: dict, key: str, convert, minimum=None, default=None):
+    """A numeric request field converted with convert, or default if absent; ValueError on bad input"""
+    value = data.get(key)
+    if value is None:
+        return default
+    try:
+        if isinstance(value, bool):
+            raise TypeError
+        number = convert(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{key} must be a number, got {value!r}")
+    if convert is int and number != float(value):
+        raise ValueError(f"{key} must be a whole number, got {value!r}")
+    if minimum is not None and number < minimum:
+        raise ValueError(f"{key} must be at least {minimum}, got {value!r}")
+    return number
+
 @app.route('/api/chat', methods=['POST'])
 def chat():
     """Handle chat requests"""
@@ -98,16 +125,24 @@ def chat():
     if not user_message:
         return jsonify({"success": False, "error": "Empty message"}), 400
     
+    try:
+        # Get top_k from request or use default
+        top_k = _number_option(data, 'top_k', int, minimum=1, default=5)
+        # Optional score cutoff (cosine similarity on cosine indexes)
+        min_score = _number_option(data, 'min_score', float)
+        # Optional speed/recall knobs of approximate (IVF/HNSW) indexes
+        nprobe = _number_option(data, 'nprobe', int, minimum=1)
+        ef_search = _number_option(data, 'ef_search', int, minimum=1)
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    
     # Check if RAG system is loaded
     success, message = load_rag_system()
     if not success:
         return jsonify({"success": False, "error": message}), 500
     
-    # Get top_k from request or use default
-    top_k = data.get('top_k', 5)
-    
     # Generate response
-    result = get_answer(user_message, top_k)
+    result = get_answer(user_message, top_k, min_score, nprobe, ef_search)
     
     if result["success"]:
         return jsonify({
@@ -129,19 +164,17 @@ def status():
     # Check if embeddings exist
     embeddings_exist = os.path.exists(os.path.join(embedding_path, "index.faiss"))
     
-    # List all supported document files
-    supported_extensions = {'.pdf', '.docx', '.doc', '.xlsx', '.xls', '.pptx', '.ppt'}
-    doc_files = []
-    if os.path.exists(doc_path):
-        doc_files = [f for f in os.listdir(doc_path) 
-                    if any(f.lower().endswith(ext) for ext in supported_extensions)]
+    # List all supported document files, including subdirectories
+    scan = discover_documents_cached(doc_path)
+    doc_files = [os.path.relpath(path, doc_path) for path in scan.files]
     
     return jsonify({
         "embeddings_exist": embeddings_exist,
         "rag_system_loaded": rag_system_loaded,
         "document_files": doc_files,
         "document_count": len(doc_files),
-        "supported_formats": list(supported_extensions)
+        "supported_formats": list(DOCUMENT_EXTENSIONS),
+        "embedding_model": model_manager.metrics()
     })
 
 if __name__ == '__main__':
@@ -158,6 +191,11 @@ if __name__ == '__main__':
     else:
         print("✅ Knowledge base found!")
     
+    # With debug=True this block also runs in the reloader's watcher process;
+    # only the serving child (WERKZEUG_RUN_MAIN) needs the model.
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        preload_model(background=True)
+
     print("🌐 Starting web server...")
     print("🔗 Open your browser and go to: http://localhost:5000")
     print("=" * 60)
@@ -0,0 +1,196 @@
+"""
+Add, replace and remove single documents in the live index.
+
+A --build scans data/ for changed documents. IndexEditor edits the index in
+place by chunk id without that scan: it embeds only the chunks of the
+document at hand, drops the vectors of its previous version with
+remove_ids(), and inserts or deletes just those metadata rows, so correcting
+one document takes seconds rather than a rebuild.
+
+Chunks added this way are not de-duplicated against the rest of the index;
+the next full build collapses them again.
+"""
+
+import os
+from pathlib import Path
+from typing import Dict, List, Set, Tuple
+
+import numpy as np
+
+from document_loader import DocumentLoader
+from embedder import (describe_index, embed_chunks, get_tokenizer, index_metric, open_embedding_cache,
+                      prepare_vectors, save_vectors_file)
+from extraction_cache import EXTRACT_CACHE_DIR
+from index_factory import (add_with_ids, convert_to_stable_ids, has_stable_ids, index_type, supports_removal,
+                           write_index)
+from manifest import BuildManifest, load_index_info, save_index_info
+from metadata_store import METADATA_DB, MetadataStore, MetadataUpdater, has_chunk_ids, migrate_to_chunk_ids
+from pipeline import iter_chunk_records, iter_documents
+from retriever import load_faiss_index
+
+
+def document_key(file_path) -> str:
+    """The manifest key and metadata path of a document given on the command line"""
+    return BuildManifest.key(os.path.relpath(file_path))
+
+
+class IndexEditor:
+    """
+    In-place edits of the index in embedding_dir, written out by save().
+
+    Indexes and metadata of older builds, addressed by vector position, are
+    migrated to chunk ids (equal to their positions) when opened.
+    """
+
+    def __init__(self, embedding_dir: str, chunking: str = "words", extract_cache: bool = True,
+                 embed_cache: bool = True):
+        self.embedding_dir = embedding_dir
+        self.db_path = os.path.join(embedding_dir, METADATA_DB)
+        self.index, metadata = load_faiss_index(embedding_dir)
+        self.info = load_index_info(embedding_dir)
+        self.metric = index_metric(self.index)
+        self.params = self.info.get("index") or {"type": index_type(self.index)}
+        self.next_id = self.info.get("next_id", self.index.ntotal)
+        self._migrate(metadata)
+        self.metadata = MetadataUpdater(self.db_path)
+        self.manifest = BuildManifest.load(embedding_dir)
+        self.loader = DocumentLoader(cache_dir=EXTRACT_CACHE_DIR if extract_cache else None)
+        self.embed_cache = embed_cache
+        self.cache = None
+        self.chunking = chunking
+        self.tokenizer, self.max_tokens = None, None
+        self.added = 0
+        self._removed: List[int] = []
+
+    def _migrate(self, metadata):
+        """Give an index and metadata of an older build explicit chunk ids"""
+        convert_index = not has_stable_ids(self.index) and index_type(self.index) != "hnsw"
+        convert_metadata = not isinstance(metadata, MetadataStore) or not has_chunk_ids(self.db_path)
+        if convert_index or convert_metadata:
+            print("🔧 Migrating the index to stable chunk ids (one-time)...")
+        if convert_index:
+            self.index = convert_to_stable_ids(self.index, self.metric, self.params)
+            self._write_index()
+        if convert_metadata:
+            migrate_to_chunk_ids(self.db_path, metadata)
+        elif isinstance(metadata, MetadataStore):
+            metadata.close()
+
+    def _write_index(self):
+        tmp_path = os.path.join(self.embedding_dir, "index.faiss.tmp")
+        write_index(self.index, tmp_path)
+        os.replace(tmp_path, os.path.join(self.embedding_dir, "index.faiss"))
+        save_vectors_file(self.index, self.embedding_dir)
+        save_index_info(self.embedding_dir, describe_index(self.index, self.params, self.next_id))
+
+    def _chunk(self, paths: List[str]) -> Tuple[List[Dict], Dict[str, Dict]]:
+        """Extract and chunk documents, returning their chunk records and manifest entries"""
+        if self.chunking == "tokens" and self.tokenizer is None:
+            self.tokenizer, self.max_tokens = get_tokenizer()
+            if not getattr(self.tokenizer, "is_fast", False):
+                print("⚠️ The embedding model has no fast tokenizer - falling back to word-based chunking.")
+                self.tokenizer, self.chunking = None, "words"
+        extracted = {}
+        counts = {"documents": 0, "chunks": 0}
+        documents = iter_documents(self.loader, [Path(p) for p in paths], 1, extracted)
+        records = list(iter_chunk_records(documents, counts, self.tokenizer, self.max_tokens))
+        return records, extracted
+
+    def _take_out(self, paths: Set[str]) -> Set[str]:
+        """Remove documents from the index, returning the orphaned ones to re-index"""
+        stale, ids = self.metadata.affected(paths)
+        if ids and not supports_removal(self.index):
+            raise ValueError(f"{index_type(self.index)} indexes cannot drop vectors in place "
+                             f"(rebuild with --build --full instead)")
+        if ids:
+            self.index.remove_ids(np.asarray(ids, dtype="int64"))
+            self._removed.extend(ids)
+            print(f"🗑️ Removed {len(ids)} chunk(s) of {len(stale)} document(s)")
+        self.metadata.drop_duplicate_refs(stale)
+        for path in stale:
+            self.manifest.entries.pop(path, None)
+        return stale - set(paths)
+
+    def _put_in(self, records: List[Dict], extracted: Dict[str, Dict]):
+        """Embed chunk records and add them under fresh chunk ids"""
+        self.manifest.entries.update(extracted)
+        if not records:
+            return
+        if self.cache is None and self.embed_cache:
+            self.cache = open_embedding_cache()
+        vectors = prepare_vectors(embed_chunks([r["text"] for r in records], show_progress_bar=False,
+                                               cache=self.cache), self.metric)
+        if vectors.shape[1] != self.index.d:
+            raise ValueError(f"The embedding model produces {vectors.shape[1]}-dim vectors but the index holds "
+                             f"{self.index.d}-dim ones - rebuild with --build --full")
+        ids = np.arange(self.next_id, self.next_id + len(records), dtype="int64")
+        add_with_ids(self.index, vectors, ids)
+        self.metadata.insert(records, ids)
+        self.next_id += len(records)
+        self.added += len(records)
+
+    def _reindex_orphans(self, orphaned: Set[str]):
+        on_disk = sorted(p for p in orphaned if os.path.isfile(p))
+        if not on_disk:
+            return
+        print(f"♻️ Also re-indexing {len(on_disk)} document(s) whose duplicate chunks were merged into removed ones")
+        self._put_in(*self._chunk(on_disk))
+
+    def add_document(self, file_path) -> int:
+        """Index a document, replacing its previous version if it is already indexed; returns chunks added"""
+        path = document_key(file_path)
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f"No such document: {file_path}")
+        if Path(path).suffix.lower() not in DocumentLoader.SUPPORTED_EXTENSIONS:
+            raise ValueError(f"Unsupported document type: {Path(path).suffix}")
+        # Extract before touching the index, so a bad file leaves the old version in place
+        records, extracted = self._chunk([path])
+        if path not in extracted:
+            raise ValueError(f"Could not extract {file_path} - it was not indexed")
+        added = self.added
+        orphaned = self._take_out({path})
+        self._put_in(records, extracted)
+        self._reindex_orphans(orphaned)
+        return self.added - added
+
+    def replace_document(self, file_path) -> int:
+        """Re-index a document that is already in the index; returns chunks added"""
+        if not self.metadata.ids_for_paths([document_key(file_path)]):
+            raise ValueError(f"{file_path} is not in the index - use add_document()")
+        return self.add_document(file_path)
+
+    def remove_document(self, source: str) -> int:
+        """Remove a document, given by path or file name; returns chunks removed"""
+        path = document_key(source)
+        paths = self.metadata.paths_for(path) or self.metadata.paths_for(source)
+        if len(paths) > 1:
+            raise ValueError(f"{source!r} matches {len(paths)} documents ({', '.join(paths)}) - pass its path instead")
+        if not paths:
+            if path in self.manifest.entries:
+                # Indexed without any extractable text
+                del self.manifest.entries[path]
+                return 0
+            raise ValueError(f"No indexed document matches {source!r}")
+        removed = len(self._removed)
+        self._reindex_orphans(self._take_out(set(paths)))
+        return len(self._removed) - removed
+
+    def save(self):
+        """
+        Write the edits so readers that load the index afterwards never see an
+        id without metadata: new rows are committed before the index that
+        returns their ids, rows of removed chunks are deleted after it.
+        Servers still holding the previous index skip hits whose rows are gone
+        (see retrieve()) until they reload it on the new index_info.json.
+        """
+        self.metadata.commit()
+        self._write_index()
+        self.metadata.delete(self._removed)
+        self.metadata.commit()
+        self._removed = []
+        self.manifest.save(self.embedding_dir)
+        if self.cache is not None:
+            self.cache.flush()
+
+    def close(self):
+        self.metadata.close()
@@ -0,0 +1,405 @@
+"""
+FAISS index types for the chunk index.
+
+"flat" is exact search; "ivf_flat" and "ivf_pq" cluster vectors into inverted
+lists and scan only the nprobe closest lists per query (ivf_pq also
+compresses vectors into product-quantizer codes); "hnsw" walks a proximity
+graph, exploring ef_search candidates per query. The parameters an index was
+built with are stored in embeddings/index_info.json so later loads and
+incremental builds reuse them.
+
+"flat", "ivf_flat" and "hnsw" can store vectors at reduced precision: fp16
+halves them, sq8 (8-bit scalar quantization, value ranges trained on a
+sample) quarters them. Compressed indexes can keep the float32 vectors on
+disk to re-score their top candidates exactly (RescoredIndex).
+
+Vectors are added under stable chunk ids rather than positions: IVF indexes
+take ids natively, the others are wrapped in an IndexIDMap2. Removing a
+document then never renumbers the chunks of other documents.
+"""
+
+import math
+from typing import Dict
+
+import faiss
+import numpy as np
+
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+
+# "l2" keeps raw vectors in an L2 index; "cosine" stores L2-normalized vectors
+# in an inner-product index, so search scores are cosine similarities
+METRICS = ("l2", "cosine")
+
+DEFAULT_NLIST = 1024
+DEFAULT_NPROBE = 16
+PQ_NBITS = 8
+DEFAULT_HNSW_M = 32
+DEFAULT_EF_CONSTRUCTION = 80
+DEFAULT_EF_SEARCH = 64
+
+# "fp32" keeps full vectors; "fp16" and "sq8" store 2 and 1 byte(s) per dimension
+STORAGE_TYPES = ("fp32", "fp16", "sq8")
+_SQ_TYPES = {"fp16": faiss.ScalarQuantizer.QT_fp16, "sq8": faiss.ScalarQuantizer.QT_8bit}
+
+# Candidates taken per requested result before exact re-scoring
+DEFAULT_RESCORE_FACTOR = 4
+
+# Sample for the per-dimension value ranges of sq8 codes
+SQ_TRAIN_ROWS = 65536
+
+# k-means wants at least 39 points per centroid; buffer a bit more than that
+TRAIN_POINTS_PER_LIST = 64
+MIN_POINTS_PER_LIST = 39
+
+# Raw vectors of flat indexes and their chunk ids, for memory-mapped serving
+VECTORS_FILE = "vectors.npy"
+IDS_FILE = "vector_ids.npy"
+
+
+def _faiss_metric(metric: str) -> int:
+    if metric not in METRICS:
+        raise ValueError(f"Unknown metric {metric!r}, expected one of {METRICS}")
+    return faiss.METRIC_INNER_PRODUCT if metric == "cosine" else faiss.METRIC_L2
+
+
+def index_params(index_type: str = "flat", nlist: int = None, pq_m: int = None, hnsw_m: int = None,
+                 nprobe: int = None, ef_search: int = None, storage: str = "fp32", rescore: int = None) -> Dict:
+    """Build-time parameters for an index type, with defaults filled in"""
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type {index_type!r}, expected one of {INDEX_TYPES}")
+    storage = storage or "fp32"
+    if storage not in STORAGE_TYPES:
+        raise ValueError(f"Unknown storage {storage!r}, expected one of {STORAGE_TYPES}")
+    if storage != "fp32" and index_type == "ivf_pq":
+        raise ValueError("ivf_pq already compresses vectors into PQ codes; storage applies to flat, ivf_flat and hnsw")
+    if rescore and storage == "fp32" and index_type != "ivf_pq":
+        raise ValueError("Re-scoring only helps compressed vectors: use it with fp16/sq8 storage or ivf_pq")
+    params = {"type": index_type}
+    if storage != "fp32":
+        params["storage"] = storage
+    if rescore:
+        params["rescore"] = rescore
+    if index_type in ("ivf_flat", "ivf_pq"):
+        params["nlist"] = nlist or DEFAULT_NLIST
+        params["nprobe"] = nprobe or DEFAULT_NPROBE
+    if index_type == "ivf_pq":
+        # None: chosen from the vector dimension once it is known
+        params["pq_m"] = pq_m
+        params["pq_nbits"] = PQ_NBITS
+    if index_type == "hnsw":
+        params["hnsw_m"] = hnsw_m or DEFAULT_HNSW_M
+        params["ef_construction"] = DEFAULT_EF_CONSTRUCTION
+        params["ef_search"] = ef_search or DEFAULT_EF_SEARCH
+    return params
+
+
+def _is_ivf(params: Dict) -> bool:
+    return params.get("type", "flat") in ("ivf_flat", "ivf_pq")
+
+
+def needs_training(params: Dict) -> bool:
+    return _is_ivf(params) or params.get("storage") == "sq8"
+
+
+def training_rows(params: Dict) -> int:
+    """Vectors to buffer before the index is trained"""
+    if not needs_training(params):
+        return 0
+    if not _is_ivf(params):
+        return SQ_TRAIN_ROWS
+    rows = params.get("target_nlist", params["nlist"]) * TRAIN_POINTS_PER_LIST
+    if params["type"] == "ivf_pq":
+        # Each sub-quantizer codebook is a k-means with 2**nbits centroids
+        rows = max(rows, (1 << params["pq_nbits"]) * TRAIN_POINTS_PER_LIST)
+    return rows
+
+
+def _default_pq_m(dim: int) -> int:
+    # About 8 dimensions per sub-quantizer; m has to divide the dimension
+    for m in range(max(1, dim // 8), 0, -1):
+        if dim % m == 0:
+            return m
+    return 1
+
+
+def fit_params(params: Dict, dim: int, train_rows: int) -> Dict:
+    """
+    Adapt parameters to the vectors actually available for training.
+
+    Corpora smaller than the training buffer get fewer inverted lists (and
+    smaller PQ codebooks), since k-means needs several points per centroid.
+    """
+    params = dict(params)
+    if not needs_training(params):
+        return params
+    params["trained_on"] = train_rows
+    if not _is_ivf(params):
+        return params
+    # Remember what was asked for, so a rebuild of a grown corpus can use it
+    target = params.setdefault("target_nlist", params["nlist"])
+    nlist = max(1, min(target, train_rows // MIN_POINTS_PER_LIST))
+    if nlist < target:
+        print(f"📉 Only {train_rows} vector(s) to train on - using {nlist} inverted list(s) instead of {target}")
+    params["nlist"] = nlist
+    params["nprobe"] = min(params.setdefault("target_nprobe", params["nprobe"]), nlist)
+    if params["type"] == "ivf_pq":
+        params["pq_m"] = params["pq_m"] or _default_pq_m(dim)
+        if dim % params["pq_m"]:
+            raise ValueError(f"pq_m={params['pq_m']} must divide the vector dimension {dim}")
+        params["pq_nbits"] = max(1, min(params["pq_nbits"], int(math.log2(max(train_rows // MIN_POINTS_PER_LIST, 2)))))
+    return params
+
+
+def create_index(dim: int, metric: str = "l2", params: Dict = None):
+    """Create an empty index; IVF indexes still have to be trained"""
+    params = params or {"type": "flat"}
+    faiss_metric = _faiss_metric(metric)
+    index_type = params.get("type", "flat")
+    sq_type = _SQ_TYPES.get(params.get("storage"))
+    if index_type == "flat":
+        if sq_type is not None:
+            return faiss.IndexScalarQuantizer(dim, sq_type, faiss_metric)
+        return faiss.IndexFlatIP(dim) if metric == "cosine" else faiss.IndexFlatL2(dim)
+    if index_type == "hnsw":
+        if sq_type is not None:
+            index = faiss.IndexHNSWSQ(dim, sq_type, params["hnsw_m"], faiss_metric)
+        else:
+            index = faiss.IndexHNSWFlat(dim, params["hnsw_m"], faiss_metric)
+        index.hnsw.efConstruction = params["ef_construction"]
+        index.hnsw.efSearch = params["ef_search"]
+        return index
+    quantizer = faiss.IndexFlatIP(dim) if metric == "cosine" else faiss.IndexFlatL2(dim)
+    if index_type == "ivf_flat" and sq_type is not None:
+        index = faiss.IndexIVFScalarQuantizer(quantizer, dim, params["nlist"], sq_type, faiss_metric)
+    elif index_type == "ivf_flat":
+        index = faiss.IndexIVFFlat(quantizer, dim, params["nlist"], faiss_metric)
+    elif index_type == "ivf_pq":
+        index = faiss.IndexIVFPQ(quantizer, dim, params["nlist"], params["pq_m"], params["pq_nbits"], faiss_metric)
+    else:
+        raise ValueError(f"Unknown index type {index_type!r}, expected one of {INDEX_TYPES}")
+    index.nprobe = params["nprobe"]
+    return index
+
+
+def train_index(dim: int, metric: str, params: Dict, sample: np.ndarray):
+    """Create and train an index on sample vectors, returning (index, fitted params)"""
+    params = fit_params(params, dim, len(sample))
+    index = create_index(dim, metric, params)
+    if not index.is_trained:
+        what = f"{params['nlist']} list(s)" if _is_ivf(params) else f"{params['storage']} value ranges"
+        print(f"🎓 Training {params['type']} index ({what}) on {len(sample)} vector(s)...")
+        index.train(sample)
+    return index, params
+
+
+class MappedFlatIndex:
+    """
+    Read-only exact index over a memory-mapped vectors.npy.
+
+    Searches with faiss.knn straight from the mapping, so opening it costs
+    nothing up front, and processes serving the same index share its pages
+    in the OS page cache instead of each holding a private copy. Results
+    match IndexFlatL2 / IndexFlatIP over the same vectors.
+    """
+
+    def __init__(self, vectors: np.ndarray, metric: str = "l2", ids: np.ndarray = None):
+        self.vectors = vectors
+        self.ids = ids
+        self.metric_type = _faiss_metric(metric)
+        self.d = vectors.shape[1]
+        self.ntotal = len(vectors)
+        self.is_trained = True
+
+    def search(self, x: np.ndarray, k: int, params=None):
+        distances, rows = faiss.knn(np.ascontiguousarray(x, dtype="float32"), self.vectors, k, metric=self.metric_type)
+        if self.ids is None:
+            return distances, rows
+        # Rows to chunk ids; -1 (no result) stays -1
+        return distances, np.where(rows >= 0, self.ids[np.maximum(rows, 0)], -1)
+
+    def reconstruct_batch(self, ids: np.ndarray) -> np.ndarray:
+        """The vectors of the given chunk ids (vector_ids.npy is sorted), reading only their rows"""
+        rows = ids if self.ids is None else np.searchsorted(self.ids, ids)
+        return np.asarray(self.vectors[rows], dtype="float32")
+
+
+class RescoredIndex:
+    """
+    A compressed index whose candidates are re-scored against float32 vectors.
+
+    search() takes `factor` times the requested number of candidates from the
+    compressed index and re-ranks them by exact distance to the raw vectors,
+    which recovers most of the ranking precision lost to fp16/sq8/PQ codes.
+    While building, the raw vectors are an IndexIDMap2 flat index kept in step
+    by add_with_ids() and remove_ids(); when serving, they are the
+    memory-mapped vectors.npy, of which only candidate rows are read.
+    """
+
+    def __init__(self, index, raw, factor: int = DEFAULT_RESCORE_FACTOR):
+        self.index = index
+        self.raw = raw
+        self.factor = factor
+        self.metric_type = index.metric_type
+        self.d = index.d
+
+    @property
+    def ntotal(self) -> int:
+        return self.index.ntotal
+
+    @property
+    def is_trained(self) -> bool:
+        return self.index.is_trained
+
+    def add_with_ids(self, x: np.ndarray, ids: np.ndarray):
+        self.index.add_with_ids(x, ids)
+        self.raw.add_with_ids(x, ids)
+
+    def remove_ids(self, ids: np.ndarray) -> int:
+        self.raw.remove_ids(ids)
+        return self.index.remove_ids(ids)
+
+    def search(self, x: np.ndarray, k: int, params=None):
+        x = np.ascontiguousarray(x, dtype="float32")
+        _, candidates = self.index.search(x, k * self.factor, params=params)
+        inner_product = self.metric_type == faiss.METRIC_INNER_PRODUCT
+        # Padding as faiss pads missing results
+        distances = np.full((len(x), k), -np.finfo("float32").max if inner_product else np.finfo("float32").max,
+                            dtype="float32")
+        ids = np.full((len(x), k), -1, dtype="int64")
+        for q, row in enumerate(candidates):
+            row = row[row >= 0]
+            if not len(row):
+                continue
+            vectors = self.raw.reconstruct_batch(row)
+            if inner_product:
+                exact = vectors @ x[q]
+                best = np.argsort(-exact, kind="stable")[:k]
+            else:
+                exact = ((vectors - x[q]) ** 2).sum(axis=1)
+                best = np.argsort(exact, kind="stable")[:k]
+            distances[q, :len(best)] = exact[best]
+            ids[q, :len(best)] = row[best]
+        return distances, ids
+
+
+def with_rescoring(index, params: Dict):
+    """Keep float32 copies of the vectors next to a compressed index, if the build asks for re-scoring"""
+    if not params or not params.get("rescore"):
+        return index
+    raw = faiss.IndexIDMap2(faiss.IndexFlat(index.d, index.metric_type))
+    return RescoredIndex(index, raw, params["rescore"])
+
+
+def write_index(index, path: str):
+    """Write index.faiss; the raw vectors of a RescoredIndex are saved to vectors.npy instead"""
+    faiss.write_index(index.index if isinstance(index, RescoredIndex) else index, path)
+
+
+def base_index(index):
+    """The index inside any id-mapping or re-scoring wrappers, downcast to its concrete type"""
+    if isinstance(index, RescoredIndex):
+        index = index.index
+    if isinstance(index, MappedFlatIndex):
+        return index
+    index = faiss.downcast_index(index)
+    while isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+        index = faiss.downcast_index(index.index)
+    return index
+
+
+def index_type(index) -> str:
+    base = base_index(index)
+    if isinstance(base, faiss.IndexIVFPQ):
+        return "ivf_pq"
+    if isinstance(base, faiss.IndexIVF):
+        return "ivf_flat"
+    if isinstance(base, faiss.IndexHNSW):
+        return "hnsw"
+    return "flat"
+
+
+def has_stable_ids(index) -> bool:
+    """Whether search results are chunk ids (True) or plain positions"""
+    if isinstance(index, RescoredIndex):
+        return True
+    index = faiss.downcast_index(index)
+    return isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2, faiss.IndexIVF))
+
+
+def with_stable_ids(index):
+    """Make an empty index accept add_with_ids: IVF natively, others through an IndexIDMap2"""
+    if isinstance(faiss.downcast_index(index), faiss.IndexIVF):
+        return index
+    return faiss.IndexIDMap2(index)
+
+
+def convert_to_stable_ids(index, metric: str, params: Dict, block_rows: int = 65536):
+    """
+    Rebuild a flat index of older builds, whose ids are positions, with explicit ids.
+
+    The ids stay the same (0..ntotal-1), so existing metadata still lines up.
+    HNSW indexes are returned as they are: they never remove vectors, so
+    positions stay valid ids and add_with_ids() keeps appending to them.
+    """
+    if has_stable_ids(index) or index_type(index) == "hnsw":
+        return index
+    converted = with_stable_ids(create_index(index.d, metric, params))
+    for start in range(0, index.ntotal, block_rows):
+        rows = min(block_rows, index.ntotal - start)
+        converted.add_with_ids(index.reconstruct_n(start, rows), np.arange(start, start + rows, dtype="int64"))
+    return converted
+
+
+def add_with_ids(index, vectors: np.ndarray, ids: np.ndarray):
+    """Add vectors under the given chunk ids"""
+    if has_stable_ids(index):
+        index.add_with_ids(vectors, np.asarray(ids, dtype="int64"))
+        return
+    # HNSW index of an older build: ids are positions, so they must continue them
+    if len(ids) and ids[0] != index.ntotal:
+        raise ValueError(f"chunk id {ids[0]} does not continue an index numbered by position ({index.ntotal} vectors)")
+    index.add(vectors)
+
+
+def stored_ids(index) -> np.ndarray:
+    """Chunk ids in storage order"""
+    if isinstance(index, RescoredIndex):
+        index = index.index
+    index = faiss.downcast_index(index)
+    if isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+        return faiss.vector_to_array(index.id_map).astype("int64")
+    if isinstance(index, faiss.IndexIVF):
+        invlists = index.invlists
+        ids = [faiss.rev_swig_ptr(invlists.get_ids(i), invlists.list_size(i)).copy()
+               for i in range(index.nlist) if invlists.list_size(i)]
+        return np.concatenate(ids).astype("int64") if ids else np.empty(0, dtype="int64")
+    return np.arange(index.ntotal, dtype="int64")
+
+
+def supports_removal(index) -> bool:
+    """Whether chunks can be removed by id (HNSW graphs can't drop nodes)"""
+    return index_type(index) != "hnsw"
+
+
+def apply_search_defaults(index, params: Dict):
+    """Set the stored query-time defaults (nprobe, ef_search) on a loaded index"""
+    base = base_index(index)
+    if isinstance(base, faiss.IndexIVF) and params.get("nprobe"):
+        base.nprobe = params["nprobe"]
+    if isinstance(base, faiss.IndexHNSW) and params.get("ef_search"):
+        base.hnsw.efSearch = params["ef_search"]
+
+
+def search_parameters(index, nprobe: int = None, ef_search: int = None):
+    """
+    Per-query search parameters, or None to use the index defaults.
+
+    Passed to index.search() instead of mutating the index, so concurrent
+    requests with different settings don't interfere.
+    """
+    base = base_index(index)
+    if nprobe and isinstance(base, faiss.IndexIVF):
+        return faiss.SearchParametersIVF(nprobe=nprobe)
+    if ef_search and isinstance(base, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(efSearch=ef_search)
+    return None
@@ -0,0 +1,156 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+MANIFEST_FILE = "manifest.json"
+QUARANTINE_FILE = "quarantine.json"
+INDEX_INFO_FILE = "index_info.json"
+
+
+def _load_json(path: str, what: str) -> Dict:
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"⚠️ Ignoring unreadable {what}: {e}")
+        return {}
+
+
+def _save_json(path: str, data: Dict):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def load_index_info(embedding_dir: str) -> Dict:
+    """How the index was built (metric, dimension, model), as recorded by the last build"""
+    return _load_json(os.path.join(embedding_dir, INDEX_INFO_FILE), "index info")
+
+
+def save_index_info(embedding_dir: str, info: Dict):
+    _save_json(os.path.join(embedding_dir, INDEX_INFO_FILE), info)
+
+
+def file_sha256(file_path, block_size: int = 1 << 20) -> str:
+    """Hash a file's content in fixed-size blocks"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class BuildManifest:
+    """
+    Record of the document versions that are currently in the index.
+
+    Each entry is keyed by the document path and stores its size, mtime and
+    content hash. Size and mtime are only used to skip re-hashing files that
+    were not touched; the content hash decides whether a file has changed.
+    """
+
+    def __init__(self, entries: Dict[str, Dict] = None):
+        self.entries = entries or {}
+
+    @classmethod
+    def load(cls, embedding_dir: str) -> "BuildManifest":
+        data = _load_json(os.path.join(embedding_dir, MANIFEST_FILE), "build manifest")
+        return cls(data.get("files", {}))
+
+    def save(self, embedding_dir: str):
+        _save_json(os.path.join(embedding_dir, MANIFEST_FILE), {"files": self.entries})
+
+    @staticmethod
+    def key(file_path) -> str:
+        return Path(file_path).as_posix()
+
+    @staticmethod
+    def describe(file_path, content_hash: str = None, stat: os.stat_result = None) -> Dict:
+        """Build the manifest entry for a file as it is on disk now"""
+        stat = stat or os.stat(file_path)
+        return {
+            "size": stat.st_size,
+            "mtime": stat.st_mtime,
+            "sha256": content_hash or file_sha256(file_path),
+        }
+
+    def diff(self, file_paths: List[Path], stats: Dict = None, hashes: Dict = None) -> Tuple[List[Path], List[str], Dict[str, Dict]]:
+        """
+        Compare the files on disk against the manifest.
+
+        stats and hashes optionally carry os.stat results and content hashes that
+        discovery already computed, keyed by path, to avoid touching files twice.
+
+        Returns:
+            (new_or_changed, deleted, current) where new_or_changed are paths to
+            (re)index, deleted are manifest keys that no longer exist, and current
+            holds up-to-date entries for every unchanged file.
+        """
+        stats = stats or {}
+        hashes = hashes or {}
+        changed = []
+        current = {}
+        for file_path in file_paths:
+            key = self.key(file_path)
+            previous = self.entries.get(key)
+            stat = stats.get(file_path) or os.stat(file_path)
+            if previous and previous["size"] == stat.st_size and previous["mtime"] == stat.st_mtime:
+                current[key] = previous
+                continue
+
+            entry = self.describe(file_path, hashes.get(file_path), stat)
+            if previous and previous["sha256"] == entry["sha256"]:
+                # Touched but identical content: keep the vectors, refresh the stat info
+                current[key] = entry
+            else:
+                changed.append(file_path)
+
+        seen = {self.key(p) for p in file_paths}
+        deleted = [key for key in self.entries if key not in seen]
+        return changed, deleted, current
+
+
+class Quarantine:
+    """
+    Files that exceeded their extraction budget or crashed the extractor.
+
+    Quarantined files are skipped by later builds until their size or mtime
+    changes, so one bad document cannot stall every nightly build.
+    """
+
+    def __init__(self, entries: Dict[str, Dict] = None):
+        self.entries = entries or {}
+
+    @classmethod
+    def load(cls, embedding_dir: str) -> "Quarantine":
+        data = _load_json(os.path.join(embedding_dir, QUARANTINE_FILE), "quarantine list")
+        return cls(data.get("files", {}))
+
+    def save(self, embedding_dir: str):
+        _save_json(os.path.join(embedding_dir, QUARANTINE_FILE), {"files": self.entries})
+
+    def add(self, file_path, reason: str, seconds: float):
+        stat = os.stat(file_path)
+        self.entries[BuildManifest.key(file_path)] = {
+            "size": stat.st_size,
+            "mtime": stat.st_mtime,
+            "reason": reason,
+            "seconds": round(seconds, 1),
+        }
+
+    def blocks(self, file_path, stat: os.stat_result = None) -> bool:
+        """True if the file is quarantined and unchanged; changed files are released"""
+        key = BuildManifest.key(file_path)
+        entry = self.entries.get(key)
+        if not entry:
+            return False
+        stat = stat or os.stat(file_path)
+        if entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime:
+            return True
+        del self.entries[key]
+        return False
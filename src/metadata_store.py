@@ -0,0 +1,274 @@
+"""
+SQLite store for chunk metadata, addressed by chunk id.
+
+metadata.db holds one row per vector, keyed by the id the index returns for
+it: the small fields (source, path, pages, offsets, duplicate references) as
+JSON in `chunks`, and the chunk text in a separate `texts` table, so reading
+fields never pages in the text. The query path opens the database without
+reading it and fetches only the rows of the returned hits; older indexes
+with a metadata.pkl are still loaded as before.
+"""
+
+import itertools
+import json
+import os
+import sqlite3
+import threading
+from typing import Dict, Iterable, Iterator, List, Set, Tuple
+
+METADATA_DB = "metadata.db"
+LEGACY_METADATA_FILE = "metadata.pkl"
+
+# Rows fetched per query when iterating over the whole store
+ITER_BATCH = 4096
+
+# Chunk texts run to a few KB; on SQLite's default 4 KB pages most of a page
+# would go unused per row, on 64 KB pages rows pack with ~2% overhead
+PAGE_SIZE = 65536
+
+SCHEMA = """
+CREATE TABLE chunks (id INTEGER PRIMARY KEY, source TEXT, path TEXT, fields TEXT NOT NULL);
+CREATE TABLE texts (id INTEGER PRIMARY KEY, text TEXT NOT NULL);
+"""
+
+
+def _split(meta: Dict):
+    fields = {key: value for key, value in meta.items() if key not in ("text", "id")}
+    return meta.get("source"), meta.get("path"), json.dumps(fields), meta.get("text", "")
+
+
+def _join(chunk_id: int, fields: str, text: str) -> Dict:
+    meta = json.loads(fields)
+    meta["text"] = text
+    meta["id"] = chunk_id
+    return meta
+
+
+def _key_column(conn: sqlite3.Connection) -> str:
+    # Databases written before chunk ids existed name the key "position"
+    return conn.execute("PRAGMA table_info(chunks)").fetchone()[1]
+
+
+def has_chunk_ids(db_path: str) -> bool:
+    """Whether a metadata.db is keyed by chunk id, rather than by the vector positions of older builds"""
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        return _key_column(conn) == "id"
+    finally:
+        conn.close()
+
+
+def _insert(conn: sqlite3.Connection, metadatas: List[Dict], ids: Iterable[int]) -> int:
+    rows = [(int(chunk_id), *_split(meta)) for chunk_id, meta in zip(ids, metadatas)]
+    conn.executemany("INSERT INTO chunks VALUES (?, ?, ?, ?)", [row[:4] for row in rows])
+    conn.executemany("INSERT INTO texts VALUES (?, ?)", [(row[0], row[4]) for row in rows])
+    return len(rows)
+
+
+def _add_duplicates(conn: sqlite3.Connection, duplicate_refs: Dict[int, List[Dict]]):
+    for chunk_id, refs in duplicate_refs.items():
+        fields = json.loads(conn.execute("SELECT fields FROM chunks WHERE id = ?", (int(chunk_id),)).fetchone()[0])
+        fields.setdefault("duplicates", []).extend(refs)
+        conn.execute("UPDATE chunks SET fields = ? WHERE id = ?", (json.dumps(fields), int(chunk_id)))
+
+
+class MetadataStore:
+    """
+    Read-only view of metadata.db.
+
+    store[chunk_id] returns the metadata dict of one vector, with its text and
+    "id", read on demand; len() and iteration (in id order) work like the list
+    the pickle format loads. Safe to share between threads.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._key = _key_column(self._conn)
+            self._len = self._conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+        self._select = (f"SELECT c.{self._key}, c.fields, t.text FROM chunks c "
+                        f"JOIN texts t ON t.{self._key} = c.{self._key}")
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __getitem__(self, chunk_id: int) -> Dict:
+        with self._lock:
+            row = self._conn.execute(f"{self._select} WHERE c.{self._key} = ?", (int(chunk_id),)).fetchone()
+        if row is None:
+            raise IndexError(f"no metadata for chunk id {chunk_id}")
+        return _join(*row)
+
+    def __iter__(self) -> Iterator[Dict]:
+        last = -1
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    f"{self._select} WHERE c.{self._key} > ? ORDER BY c.{self._key} LIMIT ?",
+                    (last, ITER_BATCH)).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                yield _join(*row)
+            last = rows[-1][0]
+
+    def close(self):
+        self._conn.close()
+
+
+class MetadataWriter:
+    """
+    Build a new metadata.db from rows and their chunk ids.
+
+    Rows go to a temporary database that replaces the live one on commit(),
+    so readers keep a consistent view until the new index is in place.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self.tmp_path = db_path + ".tmp"
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+        self._conn = sqlite3.connect(self.tmp_path, check_same_thread=False)
+        self._conn.execute(f"PRAGMA page_size = {PAGE_SIZE}")
+        # A half-written temporary file is discarded anyway: skip the journal
+        self._conn.execute("PRAGMA journal_mode = OFF")
+        self._conn.execute("PRAGMA synchronous = OFF")
+        self._conn.executescript(SCHEMA)
+        self.count = 0
+
+    def add(self, metadatas: List[Dict], ids: Iterable[int]):
+        self.count += _insert(self._conn, metadatas, ids)
+
+    def add_duplicates(self, duplicate_refs: Dict[int, List[Dict]]):
+        """Record the sources of duplicate chunks that were collapsed into existing rows, by chunk id"""
+        _add_duplicates(self._conn, duplicate_refs)
+
+    def commit(self):
+        """Finish the database and swap it into place"""
+        self._conn.execute("CREATE INDEX chunks_path ON chunks (path)")
+        self._conn.execute("CREATE INDEX chunks_source ON chunks (source)")
+        self._conn.commit()
+        self._conn.close()
+        os.replace(self.tmp_path, self.db_path)
+        # Superseded: loaders only fall back to it when there is no metadata.db
+        legacy_path = os.path.join(os.path.dirname(self.db_path), LEGACY_METADATA_FILE)
+        if os.path.exists(legacy_path):
+            os.remove(legacy_path)
+
+    def abort(self):
+        self._conn.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+
+def migrate_to_chunk_ids(db_path: str, metadata):
+    """
+    Rewrite the metadata of an older build (metadata.pkl rows, or a
+    metadata.db keyed by vector position) as a metadata.db keyed by chunk id,
+    the ids being those positions.
+    """
+    writer = MetadataWriter(db_path)
+    rows = iter(metadata)
+    while True:
+        batch = list(itertools.islice(rows, ITER_BATCH))
+        if not batch:
+            break
+        writer.add(batch, range(writer.count, writer.count + len(batch)))
+    if isinstance(metadata, MetadataStore):
+        metadata.close()
+    writer.commit()
+
+
+class MetadataUpdater:
+    """
+    Edit metadata.db in place, for single-document edits and incremental builds.
+
+    Nothing is visible to readers until commit(). Callers order commits
+    around the index write: rows of new chunks are committed before the index
+    that returns their ids, rows of removed chunks are deleted after it, so a
+    reader that loads the new index never gets an id without metadata.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        # Builds insert rows from their embedding thread
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        if _key_column(self._conn) != "id":
+            raise RuntimeError(f"{db_path} predates chunk ids - rebuild the index with --build --full")
+
+    def paths_for(self, source: str) -> List[str]:
+        """Paths of the indexed documents matching a path, a source name or a file name"""
+        rows = self._conn.execute("SELECT DISTINCT path FROM chunks WHERE path = ? OR source = ?", (source, source))
+        paths = sorted(row[0] for row in rows)
+        if not paths:
+            rows = self._conn.execute("SELECT DISTINCT path FROM chunks WHERE path LIKE ?", (f"%{source}",))
+            paths = sorted(row[0] for row in rows if os.path.basename(row[0]) == source)
+        return paths
+
+    def ids_for_paths(self, paths: Iterable[str]) -> List[int]:
+        ids = []
+        for path in paths:
+            ids.extend(row[0] for row in self._conn.execute("SELECT id FROM chunks WHERE path = ?", (path,)))
+        return ids
+
+    def affected(self, paths: Iterable[str]) -> Tuple[Set[str], List[int]]:
+        """
+        Documents to take out together with paths, and the ids of their chunks.
+
+        A removed chunk may carry duplicates of other documents, which then
+        lose their only vector for that text and have to be re-indexed too.
+        """
+        stale = set(paths)
+        while True:
+            ids = self.ids_for_paths(stale)
+            orphaned = self.duplicate_paths(ids) - stale
+            if not orphaned:
+                return stale, ids
+            stale |= orphaned
+
+    def duplicate_paths(self, ids: Iterable[int]) -> Set[str]:
+        """Documents whose duplicate chunks were collapsed into the given chunks"""
+        paths = set()
+        for chunk_id in ids:
+            fields = json.loads(self._conn.execute("SELECT fields FROM chunks WHERE id = ?", (chunk_id,)).fetchone()[0])
+            paths.update(ref["path"] for ref in fields.get("duplicates", []) if ref.get("path"))
+        return paths
+
+    def drop_duplicate_refs(self, paths: Set[str]) -> int:
+        """Remove references to the given documents from other chunks' duplicates"""
+        changed = []
+        # Only rows that carry duplicates; the text table is never read
+        for chunk_id, fields in self._conn.execute(
+                "SELECT id, fields FROM chunks WHERE instr(fields, '\"duplicates\"') > 0").fetchall():
+            fields = json.loads(fields)
+            kept = [ref for ref in fields.get("duplicates", []) if ref.get("path") not in paths]
+            if len(kept) != len(fields.get("duplicates", [])):
+                fields["duplicates"] = kept
+                changed.append((json.dumps(fields), chunk_id))
+        self._conn.executemany("UPDATE chunks SET fields = ? WHERE id = ?", changed)
+        return len(changed)
+
+    def insert(self, metadatas: List[Dict], ids: Iterable[int]):
+        _insert(self._conn, metadatas, ids)
+
+    def add_duplicates(self, duplicate_refs: Dict[int, List[Dict]]):
+        _add_duplicates(self._conn, duplicate_refs)
+
+    def delete(self, ids: Iterable[int]):
+        rows = [(int(chunk_id),) for chunk_id in ids]
+        self._conn.executemany("DELETE FROM chunks WHERE id = ?", rows)
+        self._conn.executemany("DELETE FROM texts WHERE id = ?", rows)
+
+    def commit(self):
+        self._conn.commit()
+
+    def abort(self):
+        """Discard the uncommitted changes"""
+        self._conn.rollback()
+        self._conn.close()
+
+    def close(self):
+        self._conn.close()
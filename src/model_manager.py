@@ -0,0 +1,166 @@
+import os
+import threading
+import time
+import warnings
+from typing import Dict
+
+# Suppress the specific FutureWarning about encoder_attention_mask
+warnings.filterwarnings("ignore", message=".*encoder_attention_mask.*", category=FutureWarning)
+
+MODEL_NAME = "all-MiniLM-L6-v2"
+
+# "torch" runs the SentenceTransformer; "onnx" the exported int8 graph (see onnx_backend.py)
+EMBEDDING_BACKENDS = ("torch", "onnx")
+DEFAULT_BACKEND = os.environ.get("RAG_EMBEDDING_BACKEND", "torch")
+
+
+class ModelManager:
+    """
+    Process-wide, lazily loaded sentence transformer model.
+
+    The model is loaded on first use rather than at import, so commands that
+    never embed anything don't pay for it, and every module in the process
+    shares one copy. Loading is guarded by a lock, so concurrent requests in
+    Flask or Streamlit threads wait for a single load instead of racing.
+
+    The backend is chosen with configure() before the first load, or with the
+    RAG_EMBEDDING_BACKEND environment variable.
+    """
+
+    def __init__(self, model_name: str = MODEL_NAME, backend: str = DEFAULT_BACKEND):
+        if backend not in EMBEDDING_BACKENDS:
+            raise ValueError(f"Unknown embedding backend {backend!r}, expected one of {EMBEDDING_BACKENDS}")
+        self.model_name = model_name
+        self.backend = backend
+        self.threads = None
+        self._model = None
+        self._lock = threading.Lock()
+        self._preload_thread = None
+        self.load_seconds = None
+        self.load_mode = None
+        self.loaded_at = None
+        self.error = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._model is not None
+
+    def configure(self, backend: str = None, threads: int = None):
+        """Select the backend (and ONNX Runtime threads) used by the next load"""
+        if backend is not None and backend not in EMBEDDING_BACKENDS:
+            raise ValueError(f"Unknown embedding backend {backend!r}, expected one of {EMBEDDING_BACKENDS}")
+        with self._lock:
+            if self._model is not None and backend not in (None, self.backend):
+                raise RuntimeError(f"The {self.backend} embedding backend is already loaded")
+            self.backend = backend or self.backend
+            self.threads = threads or self.threads
+
+    def get(self):
+        """Return the model, loading it on first call"""
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    self._model = self._load()
+        return self._model
+
+    def _load(self):
+        """Load the model with offline support, recording how long it took"""
+        start = time.perf_counter()
+        if self.backend == "onnx":
+            model = self._load_onnx()
+        else:
+            model = self._load_torch()
+        self.error = None
+        self.load_seconds = time.perf_counter() - start
+        self.loaded_at = time.time()
+        print(f"✅ Loaded {self.backend} embedding model ({self.load_mode} mode) in {self.load_seconds:.1f}s")
+        return model
+
+    def _load_onnx(self):
+        from onnx_backend import ONNX_MODEL_DIR, OnnxEmbedder
+        try:
+            model = OnnxEmbedder(ONNX_MODEL_DIR, threads=self.threads)
+        except Exception as e:
+            self.error = str(e)
+            print(f"❌ Error: Could not load ONNX model: {e}")
+            print("💡 Solution: Export it once with: python src/onnx_backend.py --export --verify")
+            raise
+        self.load_mode = "onnx-int8" if model.config.get("quantized") else "onnx"
+        return model
+
+    def _load_torch(self):
+        # Imported here: sentence_transformers pulls in torch, which is slow to import
+        from sentence_transformers import SentenceTransformer
+        try:
+            # Try to load model with local_files_only=True for offline usage
+            model = SentenceTransformer(self.model_name, local_files_only=True)
+            self.load_mode = "offline"
+        except Exception as e:
+            print(f"⚠️ Warning: Could not load model in offline mode: {e}")
+            try:
+                # Try to load normally (may require internet for first download)
+                print("📡 Attempting to download model (internet required)...")
+                model = SentenceTransformer(self.model_name)
+                self.load_mode = "download"
+            except Exception as e2:
+                self.error = str(e2)
+                print(f"❌ Error: Could not load model: {e2}")
+                print("💡 Solution: Connect to internet for first-time model download, then it will work offline.")
+                raise
+        return model
+
+    def preload(self, background: bool = False):
+        """
+        Load the model ahead of the first request.
+
+        With background=True the load runs on a daemon thread and this returns
+        at once; a request that needs the model meanwhile waits for that load.
+        """
+        if self.loaded:
+            return
+        if not background:
+            self.get()
+            return
+        with self._lock:
+            if self._preload_thread is None and self._model is None:
+                self._preload_thread = threading.Thread(target=self._preload_quietly, name="model-preload", daemon=True)
+                self._preload_thread.start()
+
+    def _preload_quietly(self):
+        try:
+            self.get()
+        except Exception:
+            # Already reported by _load; the next get() retries
+            pass
+
+    def metrics(self) -> Dict:
+        """Load state and timing, for status endpoints and logs"""
+        return {
+            "model": self.model_name,
+            "backend": self.backend,
+            "loaded": self.loaded,
+            "loading": self._lock.locked(),
+            "load_mode": self.load_mode,
+            "load_seconds": round(self.load_seconds, 3) if self.load_seconds is not None else None,
+            "loaded_at": self.loaded_at,
+            "error": self.error,
+        }
+
+
+# The one instance shared by the build, the CLI and the web interfaces
+model_manager = ModelManager()
+
+
+def get_model():
+    """Return the shared sentence transformer model, loading it on first use"""
+    return model_manager.get()
+
+
+def configure_model(backend: str = None, threads: int = None):
+    """Select the embedding backend of the shared model"""
+    model_manager.configure(backend=backend, threads=threads)
+
+
+def preload_model(background: bool = False):
+    """Start loading the shared model before it is first needed"""
+    model_manager.preload(background=background)
@@ -0,0 +1,241 @@
+"""
+Quantized ONNX Runtime embedding backend.
+
+Runs the sentence transformer's encoder as an int8-quantized ONNX graph on
+CPU, with pooling and normalization done in numpy. It loads only
+onnxruntime and a fast tokenizer - not torch - so it starts faster and stays
+smaller than the PyTorch backend. OnnxEmbedder mimics the parts of
+SentenceTransformer the rest of the code uses (encode, tokenizer,
+max_seq_length).
+
+Export once, from a machine that has the PyTorch model:
+
+    python src/onnx_backend.py --export
+    python src/onnx_backend.py --verify
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Union
+
+import numpy as np
+
+ONNX_MODEL_DIR = str(Path(__file__).resolve().parent.parent / "models" / "onnx" / "all-MiniLM-L6-v2")
+ONNX_MODEL_FILE = "model_quantized.onnx"
+ONNX_CONFIG_FILE = "onnx_config.json"
+
+# Minimum cosine similarity between ONNX and PyTorch vectors of the same text
+DEFAULT_TOLERANCE = 0.98
+
+VERIFY_SENTENCES = [
+    "The system shall encrypt all data at rest.",
+    "Release notes for version 2.3 of the mobile app.",
+    "Is authentication required for the admin console?",
+    "Quarterly revenue grew by 12% compared to last year.",
+    "Risk assessment and mitigation procedures for software changes.",
+    "Hello, how are you?",
+    "",
+    " ".join(["long document text"] * 200),
+]
+
+
+class OnnxEmbedder:
+    """Sentence embeddings from an exported ONNX graph, encode()-compatible with SentenceTransformer"""
+
+    def __init__(self, model_dir: str = ONNX_MODEL_DIR, threads: int = None):
+        import onnxruntime as ort
+        from transformers import PreTrainedTokenizerFast
+
+        model_dir = Path(model_dir)
+        config_path = model_dir / ONNX_CONFIG_FILE
+        if not config_path.exists():
+            raise FileNotFoundError(
+                f"No exported ONNX model in {model_dir}. Run: python src/onnx_backend.py --export")
+        with open(config_path, "r", encoding="utf-8") as f:
+            self.config = json.load(f)
+
+        options = ort.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(str(model_dir / self.config["model_file"]), options,
+                                            providers=["CPUExecutionProvider"])
+        self._input_names = {i.name for i in self.session.get_inputs()}
+        self.tokenizer = PreTrainedTokenizerFast.from_pretrained(str(model_dir))
+        self.max_seq_length = self.config["max_seq_length"]
+        self.model_dir = model_dir
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.config["dimension"]
+
+    def _pool(self, token_embeddings: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+        mode = self.config["pooling_mode"]
+        if mode == "cls":
+            return token_embeddings[:, 0]
+        mask = attention_mask[..., None].astype(np.float32)
+        if mode == "max":
+            return np.where(mask > 0, token_embeddings, -1e9).max(axis=1)
+        return (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+
+    def encode(self, sentences: Union[str, List[str]], batch_size: int = 32, show_progress_bar: bool = False,
+               convert_to_numpy: bool = True, normalize_embeddings: bool = False, **kwargs) -> np.ndarray:
+        """Encode sentences into float32 vectors, like SentenceTransformer.encode"""
+        single = isinstance(sentences, str)
+        if single:
+            sentences = [sentences]
+        if not sentences:
+            return np.empty((0, self.get_sentence_embedding_dimension()), dtype="float32")
+
+        # Longest first so each batch pads to similar lengths
+        order = np.argsort([-len(s) for s in sentences], kind="stable")
+        vectors = np.empty((len(sentences), self.get_sentence_embedding_dimension()), dtype="float32")
+        for start in range(0, len(sentences), batch_size):
+            batch = order[start:start + batch_size]
+            features = self.tokenizer([sentences[i] for i in batch], padding=True, truncation=True,
+                                      max_length=self.max_seq_length, return_tensors="np")
+            inputs = {name: features[name].astype(np.int64) for name in self._input_names if name in features}
+            if "token_type_ids" in self._input_names and "token_type_ids" not in inputs:
+                # Single-segment input: BERT expects all zeros
+                inputs["token_type_ids"] = np.zeros_like(inputs["input_ids"])
+            token_embeddings = self.session.run(None, inputs)[0]
+            vectors[batch] = self._pool(token_embeddings, features["attention_mask"])
+
+        if self.config["normalize"] or normalize_embeddings:
+            vectors /= np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+        return vectors[0] if single else vectors
+
+
+def _pooling_mode(pooling) -> str:
+    config = pooling.get_config_dict()
+    if config.get("pooling_mode"):
+        return config["pooling_mode"]
+    # Older sentence-transformers releases store one flag per mode
+    for mode, key in (("cls", "pooling_mode_cls_token"), ("max", "pooling_mode_max_tokens"),
+                      ("mean", "pooling_mode_mean_tokens")):
+        if config.get(key):
+            return mode
+    raise ValueError(f"Unsupported pooling configuration: {config}")
+
+
+def export_onnx(model, output_dir: str = ONNX_MODEL_DIR, quantize: bool = True) -> Path:
+    """
+    Export a loaded SentenceTransformer's encoder to ONNX, optionally int8-quantized.
+
+    Writes the graph, the tokenizer files and onnx_config.json (pooling mode,
+    normalization, sequence limit) to output_dir.
+    """
+    import torch
+
+    modules = list(model)
+    transformer, pooling = modules[0], modules[1]
+    pooling_mode = _pooling_mode(pooling)
+    if pooling_mode not in ("mean", "cls", "max"):
+        raise ValueError(f"Pooling mode {pooling_mode!r} is not supported by the ONNX backend")
+    normalize = any(type(module).__name__ == "Normalize" for module in modules[2:])
+
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    tokenizer = model.tokenizer
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids")
+                   if name in tokenizer.model_input_names]
+
+    class TokenEmbeddings(torch.nn.Module):
+        def __init__(self, auto_model):
+            super().__init__()
+            self.auto_model = auto_model
+
+        def forward(self, *inputs):
+            return self.auto_model(**dict(zip(input_names, inputs))).last_hidden_state
+
+    sample = tokenizer(["an example sentence", "a second, somewhat longer example sentence"],
+                       padding=True, return_tensors="pt")
+    wrapper = TokenEmbeddings(transformer.auto_model).eval()
+    float_path = output_dir / "model.onnx"
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["token_embeddings"] = {0: "batch", 1: "sequence"}
+    with torch.no_grad():
+        torch.onnx.export(wrapper, tuple(sample[name] for name in input_names), str(float_path),
+                          input_names=input_names, output_names=["token_embeddings"],
+                          dynamic_axes=dynamic_axes, opset_version=17, dynamo=False)
+
+    model_file = float_path.name
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(str(float_path), str(output_dir / ONNX_MODEL_FILE), weight_type=QuantType.QInt8)
+        model_file = ONNX_MODEL_FILE
+
+    tokenizer.save_pretrained(str(output_dir))
+    with open(output_dir / ONNX_CONFIG_FILE, "w", encoding="utf-8") as f:
+        json.dump({
+            "model_file": model_file,
+            "pooling_mode": pooling_mode,
+            "normalize": normalize,
+            "max_seq_length": model.max_seq_length,
+            "dimension": model.get_sentence_embedding_dimension(),
+            "quantized": quantize,
+        }, f, indent=2)
+    return output_dir / model_file
+
+
+def verify_against_pytorch(onnx_model: OnnxEmbedder, torch_model, sentences: List[str] = None,
+                           tolerance: float = DEFAULT_TOLERANCE) -> Dict:
+    """
+    Compare ONNX and PyTorch vectors for the same sentences.
+
+    Returns the minimum and mean cosine similarity, the largest absolute
+    difference and whether every sentence is within tolerance.
+    """
+    sentences = sentences or VERIFY_SENTENCES
+    expected = np.asarray(torch_model.encode(sentences, show_progress_bar=False), dtype="float32")
+    actual = onnx_model.encode(sentences)
+    cosine = (expected * actual).sum(axis=1) / (
+        np.linalg.norm(expected, axis=1) * np.linalg.norm(actual, axis=1) + 1e-12)
+    return {
+        "sentences": len(sentences),
+        "min_cosine": float(cosine.min()),
+        "mean_cosine": float(cosine.mean()),
+        "max_abs_diff": float(np.abs(expected - actual).max()),
+        "tolerance": tolerance,
+        "passed": bool(cosine.min() >= tolerance),
+    }
+
+
+def _load_torch_model():
+    from model_manager import ModelManager
+    return ModelManager(backend="torch").get()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export and check the quantized ONNX embedding backend.")
+    parser.add_argument("--export", action="store_true", help="Export the PyTorch model to ONNX.")
+    parser.add_argument("--verify", action="store_true", help="Compare ONNX vectors with the PyTorch backend.")
+    parser.add_argument("--output", default=ONNX_MODEL_DIR, help="Directory of the exported model.")
+    parser.add_argument("--no-quantize", action="store_true", help="Keep float32 weights.")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="Minimum cosine similarity for --verify.")
+    args = parser.parse_args()
+
+    if not args.export and not args.verify:
+        parser.error("nothing to do: pass --export and/or --verify")
+
+    torch_model = _load_torch_model()
+    if args.export:
+        path = export_onnx(torch_model, args.output, quantize=not args.no_quantize)
+        print(f"💾 Exported {path} ({os.path.getsize(path) / 1024 / 1024:.1f} MB)")
+
+    if args.verify:
+        start = time.perf_counter()
+        onnx_model = OnnxEmbedder(args.output)
+        print(f"✅ Loaded ONNX model in {time.perf_counter() - start:.2f}s")
+        result = verify_against_pytorch(onnx_model, torch_model, tolerance=args.tolerance)
+        status = "✅ Within tolerance" if result["passed"] else "❌ Outside tolerance"
+        print(f"{status}: min cosine {result['min_cosine']:.4f} (mean {result['mean_cosine']:.4f}, "
+              f"max abs diff {result['max_abs_diff']:.4f}) over {result['sentences']} sentences")
+        if not result["passed"]:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,8 @@ import fitz  # PyMuPDF
 from pathlib import Path
 import os
 
+from document_loader import assemble_units
+
 def extract_text_from_pdfs(pdf_dir: str) -> list[tuple[str, str, list[dict]]]:
     """
     Extract text from PDFs with page-level metadata.
@@ -22,21 +24,11 @@ def extract_text_from_pdfs(pdf_dir: str) -> list[tuple[str, str, list[dict]]]:
         
         try:
             doc = fitz.open(pdf_file)
-            full_text = ""
-            page_metadata = []
-            
-            for page_num, page in enumerate(doc, 1):
-                page_text = page.get_text()
-                full_text += page_text
-                
-                # Store metadata for each page
-                page_metadata.append({
-                    "page_number": page_num,
-                    "text": page_text,
-                    "char_start": len(full_text) - len(page_text),
-                    "char_end": len(full_text)
-                })
-            
+            # Pages are concatenated back to back; metadata holds offsets only
+            full_text, page_metadata = assemble_units(
+                (("page_number", page_num, page.get_text()) for page_num, page in enumerate(doc, 1)),
+                separator=""
+            )
             doc.close()
             
             # Only add to results if we extracted some text
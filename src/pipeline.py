@@ -0,0 +1,179 @@
+import multiprocessing
+import os
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Tuple
+
+from chunker import chunk_text_by_tokens, chunk_text_with_metadata
+from manifest import BuildManifest
+
+# Number of chunks embedded and written per step of the streaming build
+BATCH_SIZE = 256
+
+# Embedding batches allowed to wait ahead of the embedding thread
+EMBED_QUEUE_SIZE = 4
+
+
+def iter_documents(loader, file_paths: List[Path], workers: int, extracted: Dict[str, Dict]) -> Iterator[Tuple[Path, tuple]]:
+    """
+    Extract documents one at a time, yielding (file_path, (filename, text, page_metadata)).
+
+    Every extracted file, including ones without extractable text, gets a fresh
+    manifest entry in `extracted` so the next incremental build can skip it.
+    Files that failed to extract (quarantined ones included) are left out so
+    the next build retries them.
+    """
+    for file_path, result, failed in loader.iter_extract_files(file_paths, workers=workers):
+        if not failed:
+            extracted[BuildManifest.key(file_path)] = BuildManifest.describe(file_path)
+        if result:
+            yield file_path, result
+
+
+def _chunk_document(text: str, page_metadata: List[Dict], tokenizer=None, max_tokens: int = None) -> List[Dict]:
+    if tokenizer is not None:
+        return chunk_text_by_tokens(text, page_metadata, tokenizer, max_tokens)
+    return chunk_text_with_metadata(text, page_metadata)
+
+
+# Tokenizer settings of a chunking worker process, sent once at start-up
+_worker_tokenizer = None
+_worker_max_tokens = None
+
+
+def _init_chunk_worker(tokenizer, max_tokens: int):
+    global _worker_tokenizer, _worker_max_tokens
+    _worker_tokenizer, _worker_max_tokens = tokenizer, max_tokens
+
+
+def _chunk_in_worker(text: str, page_metadata: List[Dict]) -> List[Dict]:
+    return _chunk_document(text, page_metadata, _worker_tokenizer, _worker_max_tokens)
+
+
+def _iter_chunked(documents: Iterable[Tuple[Path, tuple]], tokenizer, max_tokens: int,
+                  workers: int) -> Iterator[Tuple[Path, str, List[Dict]]]:
+    """Chunk documents, yielding (file_path, filename, chunks) in input order"""
+    if workers is not None and workers <= 0:
+        workers = os.cpu_count() or 1
+    if not workers or workers <= 1:
+        for file_path, (filename, text, page_metadata) in documents:
+            yield file_path, filename, _chunk_document(text, page_metadata, tokenizer, max_tokens)
+        return
+
+    # A bounded window of submitted documents keeps every worker busy while the
+    # oldest result is waited for, without reading the whole corpus ahead.
+    in_flight = deque()
+    # Spawned, not forked: the parent may already hold torch, the tokenizer and
+    # FAISS, with threads whose locks a forked child would inherit
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                             initializer=_init_chunk_worker, initargs=(tokenizer, max_tokens)) as executor:
+        for file_path, (filename, text, page_metadata) in documents:
+            in_flight.append((file_path, filename, executor.submit(_chunk_in_worker, text, page_metadata)))
+            if len(in_flight) >= workers * 2:
+                file_path, filename, future = in_flight.popleft()
+                yield file_path, filename, future.result()
+        while in_flight:
+            file_path, filename, future = in_flight.popleft()
+            yield file_path, filename, future.result()
+
+
+def iter_chunk_records(documents: Iterable[Tuple[Path, tuple]], counts: Dict[str, int],
+                       tokenizer=None, max_tokens: int = None, workers: int = 1) -> Iterator[Dict]:
+    """
+    Chunk each extracted document, yielding one metadata record per chunk.
+
+    With a tokenizer, chunks are sized in the embedding model's tokens
+    (max_tokens per chunk) instead of whitespace-separated words. With
+    workers > 1 (0 = one per CPU core) documents are chunked in a process pool
+    while the next ones are still being extracted.
+    """
+    for file_path, filename, chunks in _iter_chunked(documents, tokenizer, max_tokens, workers):
+        print(f"✂️ Chunked {filename} into {len(chunks)} chunk(s) with page tracking")
+        counts["documents"] += 1
+        for chunk_info in chunks:
+            counts["chunks"] += 1
+            yield {
+                "source": filename,
+                "path": BuildManifest.key(file_path),
+                "text": chunk_info["text"],
+                "pages": chunk_info["pages"],
+                "char_start": chunk_info["char_start"],
+                "char_end": chunk_info["char_end"]
+            }
+
+
+def iter_batches(items: Iterable, batch_size: int = BATCH_SIZE) -> Iterator[list]:
+    """Group a stream of items into lists of at most batch_size"""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class BackgroundStage:
+    """
+    Run a handler over items on a background thread behind a bounded queue.
+
+    Used for embedding, so batches are embedded while the main thread extracts
+    and chunks the next documents. put() blocks while the queue is full, so a
+    slow stage throttles the ones feeding it. An exception raised by the
+    handler is re-raised in the producing thread by the next put() or close().
+    """
+
+    _DONE = object()
+
+    def __init__(self, handler: Callable, queue_size: int = EMBED_QUEUE_SIZE, name: str = "pipeline-stage"):
+        self.handler = handler
+        self.name = name
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+        self._error = None
+        self._cancelled = False
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is self._DONE:
+                return
+            # After a failure or cancel, keep draining so put() never blocks forever
+            if self._error is not None or self._cancelled:
+                continue
+            try:
+                self.handler(item)
+            except BaseException as e:
+                self._error = e
+
+    def _raise_error(self):
+        if self._error is not None:
+            raise self._error
+
+    def put(self, item):
+        """Queue an item, blocking while the queue is full"""
+        self._raise_error()
+        if self._thread is None:
+            # Started on first use: worker pools created earlier in the build
+            # then fork before this thread exists.
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+        self._queue.put(item)
+
+    def close(self):
+        """Wait until every queued item has been handled"""
+        if self._thread is not None:
+            self._queue.put(self._DONE)
+            self._thread.join()
+        self._raise_error()
+
+    def cancel(self):
+        """Drop queued items and wait for the item in progress to finish"""
+        self._cancelled = True
+        if self._thread is not None:
+            self._queue.put(self._DONE)
+            self._thread.join()
@@ -1,51 +1,158 @@
 import faiss
+import numpy as np
+import os
 import pickle
-import warnings
-from sentence_transformers import SentenceTransformer
 
-# Suppress the specific FutureWarning about encoder_attention_mask
-warnings.filterwarnings("ignore", message=".*encoder_attention_mask.*", category=FutureWarning)
+from index_factory import (IDS_FILE, VECTORS_FILE, MappedFlatIndex, RescoredIndex, apply_search_defaults,
+                           search_parameters)
+from manifest import INDEX_INFO_FILE, load_index_info
+from metadata_store import LEGACY_METADATA_FILE, METADATA_DB, MetadataStore
+# get_model is re-exported for callers that preload the model through this module
+from model_manager import get_model
 
-# Global model variable to avoid reloading
-_model = None
+def _load_raw_vectors(path: str, info: dict, mmap: bool):
+    """
+    vectors.npy as a MappedFlatIndex (memory-mapped or read into memory), or
+    None if it is missing or not from the same build as index.faiss
+    """
+    vectors_path = os.path.join(path, VECTORS_FILE)
+    if not os.path.exists(vectors_path):
+        return None
+    mmap_mode = "r" if mmap else None
+    vectors = np.load(vectors_path, mmap_mode=mmap_mode)
+    ids_path = os.path.join(path, IDS_FILE)
+    # Indexes of older builds have no id file: their ids are row positions
+    ids = np.load(ids_path, mmap_mode=mmap_mode) if os.path.exists(ids_path) else None
+    # Written alongside index.faiss by the same build
+    if vectors.shape != (info.get("vectors"), info.get("dimension")) or (ids is not None and len(ids) != len(vectors)):
+        return None
+    return MappedFlatIndex(vectors, info.get("metric", "l2"), ids)
 
-def get_model():
-    """Lazy load the sentence transformer model with offline support"""
-    global _model
-    if _model is None:
-        try:
-            # Try to load model with local_files_only=True for offline usage
-            _model = SentenceTransformer("all-MiniLM-L6-v2", local_files_only=True)
-            print("✅ Loaded sentence transformer model (offline mode)")
-        except Exception as e:
-            print(f"⚠️ Warning: Could not load model in offline mode: {e}")
+def _map_index(path: str, info: dict):
+    """Open the index memory-mapped, or return None if this index can't be"""
+    params = info.get("index", {})
+    if params.get("type", "flat") == "flat" and params.get("storage", "fp32") == "fp32":
+        index = _load_raw_vectors(path, info, mmap=True)
+        if index is None:
+            print(f"⚠️ No up-to-date {VECTORS_FILE} for memory-mapped loading - rebuild the index to create it")
+        return index
+    try:
+        # Maps IVF inverted lists, or (on faiss builds that can) the vector codes
+        # of compressed flat and HNSW indexes; HNSW graphs are still read into memory
+        if params.get("type", "flat").startswith("ivf"):
+            flags = faiss.IO_FLAG_MMAP
+        else:
+            flags = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP)
+        return faiss.read_index(os.path.join(path, "index.faiss"), flags | faiss.IO_FLAG_READ_ONLY)
+    except RuntimeError as e:
+        print(f"⚠️ Could not memory-map the index ({e}) - loading it into memory")
+        return None
+
+def _with_raw_vectors(index, path: str, info: dict, mmap: bool):
+    """Wrap a compressed index for exact re-scoring, if it was built with raw vectors"""
+    factor = info.get("index", {}).get("rescore")
+    if not factor:
+        return index
+    raw = _load_raw_vectors(path, info, mmap)
+    if raw is None:
+        print(f"⚠️ No up-to-date {VECTORS_FILE} to re-score with - using the compressed scores")
+        return index
+    if not mmap:
+        # Writable copy that add_with_ids/remove_ids keep in step with the index
+        vectors, ids = raw.vectors, raw.ids
+        raw = faiss.IndexIDMap2(faiss.IndexFlat(index.d, index.metric_type))
+        raw.add_with_ids(vectors, np.arange(len(vectors), dtype="int64") if ids is None else ids)
+    return RescoredIndex(index, raw, factor)
+
+def load_legacy_metadata(path: str) -> list:
+    """Read every frame of a metadata.pkl written by older builds"""
+    metadata = []
+    with open(os.path.join(path, LEGACY_METADATA_FILE), "rb") as f:
+        while True:
             try:
-                # Try to load normally (may require internet for first download)
-                print("📡 Attempting to download model (internet required)...")
-                _model = SentenceTransformer("all-MiniLM-L6-v2")
-                print("✅ Downloaded and loaded sentence transformer model")
-            except Exception as e2:
-                print(f"❌ Error: Could not load model: {e2}")
-                print("💡 Solution: Connect to internet for first-time model download, then it will work offline.")
-                raise
-    return _model
-
-def load_faiss_index(path: str):
-    index = faiss.read_index(f"{path}/index.faiss")
-    with open(f"{path}/metadata.pkl", "rb") as f:
-        metadata = pickle.load(f)
+                frame = pickle.load(f)
+            except EOFError:
+                break
+            if isinstance(frame, dict):
+                # Sources of duplicate chunks that were collapsed into earlier vectors
+                for position, refs in frame.get("duplicate_refs", {}).items():
+                    metadata[position].setdefault("duplicates", []).extend(refs)
+            else:
+                metadata.extend(frame)
+    return metadata
+
+def load_faiss_index(path: str, mmap: bool = False):
+    """
+    Load the index and its chunk metadata.
+
+    Metadata comes from metadata.db as a MetadataStore that reads rows on
+    demand, or from metadata.pkl for indexes built before it existed.
+
+    With mmap=True the index is opened read-only and memory-mapped where its
+    type allows, so start-up reads almost nothing and processes on the same
+    host share the vectors through the page cache. Builds that modify the
+    index must load it with mmap=False.
+
+    Indexes built with re-scoring come back as a RescoredIndex over the raw
+    vectors in vectors.npy.
+    """
+    info = load_index_info(path)
+    index = _map_index(path, info) if mmap else None
+    if index is None:
+        index = faiss.read_index(f"{path}/index.faiss")
+    # nprobe is not stored in index.faiss; restore the build's query defaults
+    apply_search_defaults(index, info.get("index", {}))
+    index = _with_raw_vectors(index, path, info, mmap)
+    db_path = os.path.join(path, METADATA_DB)
+    metadata = MetadataStore(db_path) if os.path.exists(db_path) else load_legacy_metadata(path)
     return index, metadata
 
-def retrieve(query: str, index, metadata, k: int = 5):
-    model = get_model()  # Use lazy loading
-    query_vector = model.encode([query])
-    distances, indices = index.search(query_vector, k)
+def index_version(path: str):
+    """
+    A token that changes whenever a build or in-place edit replaces the index
+    (index_info.json is written last), so long-running servers can reload it.
+    """
+    try:
+        stat = os.stat(os.path.join(path, INDEX_INFO_FILE))
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns
+
+def retrieve(query: str, index, metadata, k: int = 5, min_score: float = None,
+             nprobe: int = None, ef_search: int = None):
+    """
+    Return the k chunks closest to the query, best first.
+
+    Inner-product indexes hold normalized vectors, so their scores are cosine
+    similarities; L2 indexes report 1 / (1 + distance). With min_score, hits
+    scoring below it are dropped, which can leave fewer than k results.
+    nprobe (IVF) and ef_search (HNSW) trade speed for recall on this query
+    only; by default the values stored with the index apply.
+    """
+    model = get_model()  # Shared, lazily loaded model
+    query_vector = np.asarray(model.encode([query]), dtype="float32")
+    cosine = index.metric_type == faiss.METRIC_INNER_PRODUCT
+    if cosine:
+        faiss.normalize_L2(query_vector)
+    params = search_parameters(index, nprobe, ef_search)
+    distances, indices = index.search(query_vector, k, params=params)
     
     results = []
-    for i, (distance, idx) in enumerate(zip(distances[0], indices[0])):
-        chunk_metadata = metadata[idx].copy()
-        chunk_metadata['similarity_score'] = float(1 / (1 + distance))  # Convert distance to similarity
-        chunk_metadata['rank'] = i + 1
+    for distance, idx in zip(distances[0], indices[0]):
+        if idx < 0:
+            # Fewer than k vectors in the index, or in the probed lists
+            continue
+        score = float(distance) if cosine else float(1 / (1 + distance))  # Convert distance to similarity
+        if min_score is not None and score < min_score:
+            continue
+        try:
+            chunk_metadata = metadata[idx].copy()
+        except IndexError:
+            # Removed by an in-place edit after this index was loaded
+            continue
+        chunk_metadata['similarity_score'] = score
+        chunk_metadata['score_metric'] = "cosine" if cosine else "l2"
+        chunk_metadata['rank'] = len(results) + 1
         results.append(chunk_metadata)
     
     return results
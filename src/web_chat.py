@@ -8,8 +8,10 @@ import re
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 # Import your existing modules
-from retriever import load_faiss_index, retrieve
+from model_manager import preload_model
+from retriever import index_version, load_faiss_index, retrieve
 from generator import generate_detailed_answer
+from discovery import discover_documents
 
 # Configuration
 EMBEDDING_DIR = "../embeddings"
@@ -27,22 +29,46 @@ def initialize_session_state():
         st.session_state.metadata = None
     if "loading_complete" not in st.session_state:
         st.session_state.loading_complete = False
+    if "index_version" not in st.session_state:
+        st.session_state.index_version = None
 
 @st.cache_resource
-def load_faiss_index_cached(embedding_path):
-    """Cached version of FAISS index loading"""
-    return load_faiss_index(embedding_path)
+def loaded_indexes():
+    """The index currently held by load_faiss_index_cached, kept across script reruns"""
+    return {}
+
+@st.cache_resource(max_entries=1)
+def load_faiss_index_cached(embedding_path, version):
+    """Cached version of FAISS index loading, keyed by index version so updates are picked up"""
+    # Memory-mapped, so sessions and processes share one copy of the vectors
+    index, metadata = load_faiss_index(embedding_path, mmap=True)
+    # This entry evicts the previous version's; close its SQLite connection as well
+    # (sessions still holding it reload on their next run, seeing the new version)
+    previous = loaded_indexes().pop(embedding_path, None)
+    if previous is not None and hasattr(previous[1], "close"):
+        previous[1].close()
+    loaded_indexes()[embedding_path] = (index, metadata)
+    return index, metadata
+
+@st.cache_data(ttl=60)
+def list_documents_cached(doc_path):
+    """Cached document listing so sidebar reruns don't walk the document tree"""
+    scan = discover_documents(doc_path, detect_duplicates=False)
+    return [os.path.relpath(path, doc_path) for path in scan.files]
 
 def load_rag_system():
     """Load the RAG system (FAISS index and metadata)"""
     try:
-        if not st.session_state.rag_initialized:
+        # Construct the correct path to embeddings
+        embedding_path = os.path.join(os.path.dirname(__file__), EMBEDDING_DIR)
+        version = index_version(embedding_path)
+        # A build or in-place edit since this session loaded the index replaces it
+        if not st.session_state.rag_initialized or st.session_state.index_version != version:
             # Show loading message immediately
             loading_placeholder = st.empty()
             loading_placeholder.info("🔄 Loading knowledge base... This may take a moment on first load.")
-            
-            # Construct the correct path to embeddings
-            embedding_path = os.path.join(os.path.dirname(__file__), EMBEDDING_DIR)
+            # The embedding model is shared by all sessions; load it alongside the index
+            preload_model(background=True)
             
             if not os.path.exists(os.path.join(embedding_path, "index.faiss")):
                 loading_placeholder.empty()
@@ -51,9 +77,10 @@ def load_rag_system():
                 return False
             
             # Load the system using cached function
-            index, metadata = load_faiss_index_cached(embedding_path)
+            index, metadata = load_faiss_index_cached(embedding_path, version)
             st.session_state.index = index
             st.session_state.metadata = metadata
+            st.session_state.index_version = version
             st.session_state.rag_initialized = True
             st.session_state.loading_complete = True
             
@@ -364,9 +391,7 @@ def main():
             
             # Show all supported document files
             if os.path.exists(doc_path):
-                supported_extensions = {'.pdf', '.docx', '.doc', '.xlsx', '.xls', '.pptx', '.ppt'}
-                doc_files = [f for f in os.listdir(doc_path) 
-                           if any(f.lower().endswith(ext) for ext in supported_extensions)]
+                doc_files = list_documents_cached(doc_path)
                 if doc_files:
                     st.subheader("📄 Available Documents:")
                     for doc_file in doc_files:
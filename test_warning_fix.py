@@ -19,7 +19,8 @@ except Exception as e:
 
 # Test the retriever
 try:
-    from retriever import model as retriever_model
+    from retriever import get_model
+    retriever_model = get_model()
     print("✅ Retriever model loaded successfully")
     
     # Test encoding
@@ -28,4 +29,15 @@ try:
 except Exception as e:
     print(f"❌ Retriever error: {e}")
 
+# Both modules should share one copy of the model
+try:
+    from model_manager import model_manager
+    if embedder_model is retriever_model:
+        print("✅ Embedder and retriever share one model instance")
+    else:
+        print("❌ Embedder and retriever loaded separate model instances")
+    print(f"📊 Model load metrics: {model_manager.metrics()}")
+except Exception as e:
+    print(f"❌ Model manager error: {e}")
+
 print("All tests completed!")